@@ -1,22 +1,358 @@
-from fastapi import FastAPI, HTTPException, Query
+from anyio import to_thread
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, List
+from typing import Annotated, Optional, List
+from contextlib import contextmanager
+from cachetools import TTLCache
+import base64
+import binascii
+import functools
+import itertools
+import json
 import os
+import re
+import logging
+import select
+import threading
+import orjson
 import psycopg2
+import psycopg2.pool
+from psycopg2.extensions import (
+    ISOLATION_LEVEL_READ_COMMITTED,
+    connection as PgConnection,
+    cursor as TupleCursor,
+)
 from psycopg2.extras import RealDictCursor, Json
 
-# Database configuration
+try:
+    import redis
+except ImportError:  # optional: leaderboards fall back to an in-process cache
+    redis = None
+
+# Database configuration. The default talks to Postgres directly, where named
+# prepared statements and LISTEN both work; docker-compose routes DATABASE_URL
+# through PgBouncer and sets DB_PREPARE / DATABASE_LISTEN_URL to match.
 DATABASE_URL = os.getenv(
     "DATABASE_URL", "postgres://amen:amenities@db:5432/amenities"
 )
 
+# LISTEN needs a session of its own, which a transaction-pooling PgBouncer can't
+# give; point this straight at Postgres when DATABASE_URL goes through one
+DATABASE_LISTEN_URL = os.getenv("DATABASE_LISTEN_URL", DATABASE_URL)
+
+# Connection pool bounds (shared by every request handled by this process)
+POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN", "4"))
+POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX", "32"))
+# Seconds a request waits for a free connection before giving up with 503
+POOL_TIMEOUT = 10
+
+# Named prepared statements live on one server backend, which breaks behind a
+# transaction-pooling PgBouncer; set DB_PREPARE=0 there to send plain statements
+DB_PREPARE = os.getenv("DB_PREPARE", "1") != "0"
+
+# Sync handlers run in anyio's worker threads; allow more of them than there
+# are connections so requests queue on the pool instead of on the threadpool.
+# Route handlers must stay plain `def` (see scripts/check_sync_routes.py).
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "200"))
+
+
+class PooledConnection(PgConnection):
+    """
+    Connection that remembers which named statements it has already PREPAREd
+    and keeps one RealDictCursor around for the handlers that borrow it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Pinned once per physical connection; psycopg2 folds it into the BEGIN
+        # it already sends, so handlers never issue SET TRANSACTION themselves
+        self.set_session(isolation_level=ISOLATION_LEVEL_READ_COMMITTED, autocommit=False)
+        self.prepared = set()
+        self._shared_cursor = None
+
+    def shared_cursor(self):
+        # Cursors outlive commit/rollback, so one per connection is enough;
+        # each execute() discards whatever the previous request left behind
+        if self._shared_cursor is None or self._shared_cursor.closed:
+            self._shared_cursor = self.cursor()
+        return self._shared_cursor
+
+
+class WarmConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that keeps every returned connection open.
+    psycopg2 closes connections handed back while minconn are already idle, so a
+    burst above POOL_MIN_CONN would pay a fresh handshake on every checkout.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        # Open minconn connections up front, then retain up to maxconn idle ones
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.minconn = self.maxconn
 
+
+# Created on startup so each worker process owns its own sockets
+db_pool: Optional[WarmConnectionPool] = None
+
+# ThreadedConnectionPool raises instead of blocking when it runs dry, so cap
+# concurrent checkouts at the pool size and make extra callers wait
+db_slots = threading.BoundedSemaphore(POOL_MAX_CONN)
+
+
+@contextmanager
 def get_conn():
     """
-    Open a new database connection using RealDictCursor so we get dict-like rows.
+    Borrow a pooled connection (RealDictCursor rows) and return it to the pool on exit.
+    Any transaction left open by the handler is rolled back by the pool.
+    """
+    if not db_slots.acquire(timeout=POOL_TIMEOUT):
+        raise HTTPException(status_code=503, detail="Database busy, try again")
+    try:
+        conn = db_pool.getconn()
+        if conn.closed:
+            # Dropped while idle in the pool (e.g. server restart); replace it
+            db_pool.putconn(conn, close=True)
+            conn = db_pool.getconn()
+        try:
+            yield conn
+        finally:
+            db_pool.putconn(conn)
+    finally:
+        db_slots.release()
+
+
+def db_conn():
+    """
+    Route dependency: a pooled connection for the handler. Commits what the
+    handler leaves open when it returns, rolls back when it raises, and turns
+    database errors into 400s.
     """
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    with get_conn() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+# scope="function" runs db_conn's exit as soon as the handler returns, so the
+# commit (or its error) happens before the response goes out and the connection
+# is not held while the body is serialized and sent
+DbConn = Annotated[PooledConnection, Depends(db_conn, scope="function")]
+
+
+# -------------------------------------------------
+# Server-side prepared statements for hot queries
+# -------------------------------------------------
+
+# Parsed and planned once per pooled connection, then run with EXECUTE
+PREPARED_SQL = {
+    "get_review": """
+        SELECT reviewid, userid, amenityid, overallrating::float8 AS overallrating, ratingdetails, timestamp
+        FROM review
+        WHERE reviewid = $1
+    """,
+    "get_reviews_for_amenity": """
+        SELECT reviewid, userid, amenityid, overallrating::float8 AS overallrating, ratingdetails, timestamp
+        FROM review
+        WHERE amenityid = $1
+        ORDER BY timestamp DESC
+    """,
+    # Same list without the JSONB column: no detoasting or JSON decoding per row
+    "get_review_summaries_for_amenity": """
+        SELECT reviewid, userid, amenityid, overallrating::float8 AS overallrating, timestamp
+        FROM review
+        WHERE amenityid = $1
+        ORDER BY timestamp DESC
+    """,
+    # Also returns the amenity's rating with the new review counted, computed the
+    # way amenity_rating_mv does; the view itself only catches up on its next
+    # background refresh. The scan of review cannot see the row this statement
+    # inserts, so ratings adds it back in.
+    "create_review": """
+        WITH new_review AS (
+            INSERT INTO review (userid, amenityid, overallrating, ratingdetails)
+            VALUES ($1, $2, $3, $4)
+            RETURNING reviewid, timestamp, overallrating
+        ),
+        ratings AS (
+            SELECT overallrating FROM review WHERE amenityid = $2
+            UNION ALL
+            SELECT overallrating FROM new_review
+        )
+        SELECT
+            new_review.reviewid,
+            new_review.timestamp,
+            (SELECT AVG(overallrating)::float8 FROM ratings) AS avg_rating,
+            (SELECT COUNT(*) FROM ratings) AS review_count
+        FROM new_review
+    """,
+    "upsert_review": """
+        INSERT INTO review (userid, amenityid, overallrating, ratingdetails)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (userid, amenityid) DO UPDATE
+        SET overallrating = EXCLUDED.overallrating,
+            ratingdetails = EXCLUDED.ratingdetails,
+            timestamp = NOW()
+        RETURNING reviewid, timestamp
+    """,
+    "update_review": """
+        UPDATE review
+        SET overallrating = COALESCE($1, overallrating),
+            ratingdetails = COALESCE($2::jsonb, ratingdetails)
+        WHERE reviewid = $3
+        RETURNING reviewid, userid, amenityid, overallrating::float8 AS overallrating, ratingdetails, timestamp
+    """,
+    "delete_review": """
+        DELETE FROM review
+        WHERE reviewid = $1
+        RETURNING reviewid
+    """,
+    # Amenity plus all of its tag links in one statement; unnest() expands the
+    # tag id array into rows
+    "create_amenity_with_tags": """
+        WITH new_amenity AS (
+            INSERT INTO amenity (buildingid, type, floor, notes)
+            VALUES ($1, $2, $3, $4)
+            RETURNING amenityid
+        ),
+        attached AS (
+            INSERT INTO amenitytag (amenityid, tagid)
+            SELECT new_amenity.amenityid, tag_id
+            FROM new_amenity, unnest($5::int[]) AS tag_id
+            ON CONFLICT (amenityid, tagid) DO NOTHING
+            RETURNING tagid
+        )
+        SELECT
+            new_amenity.amenityid,
+            ARRAY(SELECT tagid FROM attached) AS attached_tags
+        FROM new_amenity
+    """,
+    "get_amenity_stats": """
+        SELECT * FROM fn_get_amenity_stats($1)
+    """,
+    # Address and the building that points at it in one round trip
+    "create_building_with_address": """
+        WITH new_address AS (
+            INSERT INTO address (address, lat, lon)
+            VALUES ($1, $2, $3)
+            RETURNING addressid
+        )
+        INSERT INTO building (name, addressid)
+        SELECT $4, addressid FROM new_address
+        RETURNING buildingid, name, addressid
+    """,
+    "get_amenity": """
+        SELECT
+            a.amenityid,
+            a.buildingid,
+            a.type,
+            a.floor,
+            a.notes,
+            b.name      AS building_name,
+            ad.address  AS address,
+            ad.lat::float8 AS lat,
+            ad.lon::float8 AS lon
+        FROM amenity a
+        JOIN building b ON a.buildingid = b.buildingid
+        JOIN address ad ON b.addressid = ad.addressid
+        WHERE a.amenityid = $1
+    """,
+    "list_users": """
+        SELECT UserId, UserName, Email, JoinDate
+        FROM "User"
+        ORDER BY UserId
+        LIMIT $1 OFFSET $2
+    """,
+    "list_users_after": """
+        SELECT UserId, UserName, Email, JoinDate
+        FROM "User"
+        WHERE UserId > $1
+        ORDER BY UserId
+        LIMIT $2
+    """,
+    "get_user": """
+        SELECT UserId, UserName, Email, JoinDate
+        FROM "User"
+        WHERE UserId = $1
+    """,
+    # Building.Name is UNIQUE, so its index serves this order and the (name, id)
+    # keyset; buildingid is only a defensive tie-break
+    "list_buildings": """
+        SELECT
+            b.buildingid,
+            b.name,
+            ad.address,
+            ad.lat::float8 AS lat,
+            ad.lon::float8 AS lon
+        FROM building b
+        JOIN address ad ON b.addressid = ad.addressid
+        ORDER BY b.name, b.buildingid
+        LIMIT $1 OFFSET $2
+    """,
+    "list_buildings_after": """
+        SELECT
+            b.buildingid,
+            b.name,
+            ad.address,
+            ad.lat::float8 AS lat,
+            ad.lon::float8 AS lon
+        FROM building b
+        JOIN address ad ON b.addressid = ad.addressid
+        WHERE (b.name, b.buildingid) > ($1::varchar, $2::int)
+        ORDER BY b.name, b.buildingid
+        LIMIT $3
+    """,
+    "get_building": """
+        SELECT
+            b.buildingid,
+            b.name,
+            ad.address,
+            ad.lat::float8 AS lat,
+            ad.lon::float8 AS lon
+        FROM building b
+        JOIN address ad ON b.addressid = ad.addressid
+        WHERE b.buildingid = $1
+    """,
+}
+
+
+# PREPARED_SQL rewritten with psycopg2 placeholders ($1 -> %(1)s), for DB_PREPARE=0
+# and for server-side cursors (DECLARE cannot wrap an EXECUTE)
+PLAIN_SQL = {}
+PLACEHOLDER_RE = re.compile(r"\$(\d+)")
+
+
+def execute_plain(cur, name: str, params: tuple):
+    """
+    Run a statement from PREPARED_SQL as an ordinary parameterised query.
+    """
+    if name not in PLAIN_SQL:
+        PLAIN_SQL[name] = PLACEHOLDER_RE.sub(r"%(\1)s", PREPARED_SQL[name])
+    cur.execute(PLAIN_SQL[name], {str(i): v for i, v in enumerate(params, 1)})
+
+
+def execute_prepared(cur, name: str, params: tuple):
+    """
+    EXECUTE a statement from PREPARED_SQL, PREPAREing it on this connection first if needed.
+    """
+    if not DB_PREPARE:
+        execute_plain(cur, name, params)
+        return
+
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {PREPARED_SQL[name]}")
+        conn.prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name}({placeholders})", params)
 
 
 # -------------------------------------------------
@@ -92,46 +428,261 @@ class AmenityTagCreate(BaseModel):
 # FastAPI app + CORS
 # -------------------------------------------------
 
-app = FastAPI(title="Campus Amenities API", version="0.1.0")
+app = FastAPI(
+    title="Campus Amenities API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+)
+
+# CORS for frontend: explicit origins, methods and headers instead of "*", which
+# with credentials makes Starlette echo the request's Origin/headers every time.
+# ALLOWED_ORIGINS is a comma-separated list (default: the Vite dev server).
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv(
+        "ALLOWED_ORIGINS", "http://localhost:5173,http://localhost:3000"
+    ).split(",")
+    if origin.strip()
+]
 
-# CORS for frontend (for now allow all; you can tighten later)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # in prod, set to your frontend URL
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["X-Next-Cursor"],  # let the browser read paging cursors
+    max_age=86400,  # let browsers cache preflight responses for a day
 )
 
+# Compress larger bodies (e.g. /amenities?limit=1500); level 1 keeps CPU cost low.
+# Added last so it is the outermost middleware and sees the final response.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=1)
+
+
+@app.on_event("startup")
+async def raise_threadpool_limit():
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+# -------------------------------------------------
+# Materialized view refresh
+# -------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# amenity_rating_mv plus the precomputed leaderboards, refreshed together
+RATING_VIEWS = (
+    "amenity_rating_mv",
+    "mv_leaderboard_bathrooms_vending",
+    "mv_leaderboard_coldest_fountains",
+    "mv_leaderboard_overall",
+)
+
+# Sent by triggers in init.sql whenever a table the views read changes
+RATINGS_CHANGED_CHANNEL = "ratings_changed"
+# Sent after a refresh commits, so every worker drops its cached leaderboards
+VIEWS_REFRESHED_CHANNEL = "rating_views_refreshed"
+
+# Minimum seconds between refreshes triggered by review writes
+MV_REFRESH_DEBOUNCE = 5
+# Refresh at least this often, in case a notification was missed
+MV_REFRESH_INTERVAL = 300
+# Seconds the listener waits before reconnecting after losing its connection
+LISTEN_RETRY_DELAY = 5
+
+ratings_stale = threading.Event()
+refresher_stop = threading.Event()
+
+
+def mark_ratings_stale():
+    """
+    Schedule a refresh of the rating and leaderboard views once a change is
+    heard on the listen connection.
+    """
+    ratings_stale.set()
+
+
+def refresh_rating_views():
+    with get_conn() as conn:
+        cur = conn.shared_cursor()
+        # Every worker process runs its own refresher; the transaction-scoped
+        # advisory lock lets one refresh at a time. The others skip: the holder
+        # is notified of anything committed while it refreshes and goes again
+        cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('amenity_rating_mv')) AS locked")
+        if not cur.fetchone()["locked"]:
+            conn.rollback()
+            return
+        for view in RATING_VIEWS:
+            cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+        cur.execute("SELECT pg_notify(%s, '')", (VIEWS_REFRESHED_CHANNEL,))
+        conn.commit()
+    invalidate_leaderboards()
+
+
+def run_rating_view_refresher():
+    while not refresher_stop.is_set():
+        ratings_stale.wait(timeout=MV_REFRESH_INTERVAL)
+        if refresher_stop.is_set():
+            break
+        ratings_stale.clear()
+        try:
+            refresh_rating_views()
+        except (psycopg2.Error, HTTPException) as e:
+            logger.warning("Refreshing rating views failed: %s", e)
+        refresher_stop.wait(timeout=MV_REFRESH_DEBOUNCE)
+
+
+def listen_for_rating_changes():
+    """
+    LISTEN on a dedicated connection: writes from any process mark the views
+    stale, and refreshes done by other workers clear this worker's caches.
+    """
+    while not refresher_stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_LISTEN_URL)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {RATINGS_CHANGED_CHANNEL}")
+            cur.execute(f"LISTEN {VIEWS_REFRESHED_CHANNEL}")
+            # Changes made while disconnected went unheard
+            mark_ratings_stale()
+            while not refresher_stop.is_set():
+                if not select.select([conn], [], [], LISTEN_RETRY_DELAY)[0]:
+                    continue
+                conn.poll()
+                channels = {notify.channel for notify in conn.notifies}
+                conn.notifies.clear()
+                if RATINGS_CHANGED_CHANNEL in channels:
+                    mark_ratings_stale()
+                if VIEWS_REFRESHED_CHANNEL in channels:
+                    clear_local_leaderboards()
+        except psycopg2.Error as e:
+            logger.warning("Listening for rating changes failed: %s", e)
+            refresher_stop.wait(timeout=LISTEN_RETRY_DELAY)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+# Registered before close_db_pool so the refresher stops before the pool closes
+@app.on_event("shutdown")
+def stop_rating_view_refresher():
+    refresher_stop.set()
+    ratings_stale.set()
+
+
+@app.on_event("startup")
+def open_db_pool():
+    global db_pool
+    db_pool = WarmConnectionPool(
+        minconn=POOL_MIN_CONN,
+        maxconn=POOL_MAX_CONN,
+        dsn=DATABASE_URL,
+        connection_factory=PooledConnection,
+        cursor_factory=RealDictCursor,
+    )
+
+
+@app.on_event("shutdown")
+def close_db_pool():
+    if db_pool is not None:
+        db_pool.closeall()
+
+
+# Registered after open_db_pool so the refresher never runs without a pool
+@app.on_event("startup")
+def start_rating_view_refresher():
+    threading.Thread(
+        target=run_rating_view_refresher, name="rating-mv-refresher", daemon=True
+    ).start()
+    threading.Thread(
+        target=listen_for_rating_changes, name="rating-mv-listener", daemon=True
+    ).start()
+
 
 @app.get("/")
 def root():
     return {"message": "API is running"}
 
 
+# -------------------------------------------------------
+# Keyset paging cursors
+# -------------------------------------------------------
+
+# List endpoints put an opaque cursor for the next page in this header (the
+# body stays a bare JSON array); pass it back as ?cursor= to continue
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values) -> str:
+    """
+    Pack the sort key of a page's last row into an opaque, URL-safe token.
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: tuple) -> tuple:
+    """
+    Unpack a token from encode_cursor, checking it holds one value per type.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if len(values) != len(types):
+            raise ValueError
+        return tuple(t(v) for t, v in zip(types, values))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def next_cursor_headers(rows: list, limit: int, key) -> dict:
+    """
+    Header carrying the next page's cursor, or nothing once a page comes back short.
+    """
+    if len(rows) < limit:
+        return {}
+    return {NEXT_CURSOR_HEADER: encode_cursor(key(rows[-1]))}
+
+
 # -------------------------------------------------------
 # GET /amenities  - list amenities with optional filters
 # -------------------------------------------------------
-@app.get("/amenities")
-def list_amenities(
-    keyword: Optional[str] = Query(
-        default=None,
-        description="Search across building name, address, and amenity notes.",
-    ),
-    amenity_type: Optional[str] = Query(
-        default=None,
-        description="Filter by amenity type: Bathroom, WaterFountain, VendingMachine.",
-    ),
-    limit: int = Query(default=50, ge=1, le=1500),
-    offset: int = Query(default=0, ge=0),
+
+# A lone word (what the search bar sends while the user is typing) is matched as
+# a prefix so "grain" finds "Grainger"; anything else goes through
+# websearch_to_tsquery. Both forms are served by idx_amenity_search_tsv.
+SINGLE_WORD_RE = re.compile(r"^\w+$")
+# A keyword with no word characters at all ("%", "-") gives full-text search
+# nothing to match, so it goes straight to the substring match instead
+WORD_CHAR_RE = re.compile(r"\w")
+
+# When full-text search matches nothing, retry as a substring match served by
+# the trigram indexes (catches partial words like "ainger"). Trigrams need at
+# least three characters to narrow anything down.
+SUBSTRING_MIN_LENGTH = 3
+
+
+def like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def build_amenity_page_query(
+    match: Optional[str],
+    term: Optional[str],
+    amenity_type: Optional[str],
+    keyset: Optional[tuple],
+    limit: int,
+    offset: int,
 ):
     """
-    List amenities with optional keyword search and type filter.
-    Returns building name, address, amenity info, and average rating.
+    Build one /amenities page as a PREPARED_SQL entry.
+    match is None (no keyword), "prefix", "search" or "substring".
+    Returns the statement name and its parameters.
     """
-    conn = get_conn()
-    cur = conn.cursor()
-
     query = """
         SELECT
             a.amenityid,
@@ -141,434 +692,475 @@ def list_amenities(
             a.notes,
             b.name      AS building_name,
             ad.address  AS address,
-            ad.lat,
-            ad.lon,
-            COALESCE(AVG(r.overallrating), 0) AS avg_rating,
-            COUNT(r.reviewid)                 AS review_count
+            ad.lat::float8 AS lat,
+            ad.lon::float8 AS lon,
+            COALESCE(mv.avg_rating, 0)::float8 AS avg_rating,
+            COALESCE(mv.review_count, 0)       AS review_count
         FROM amenity a
         JOIN building b ON a.buildingid = b.buildingid
         JOIN address ad ON b.addressid = ad.addressid
-        LEFT JOIN review r ON r.amenityid = a.amenityid
+        LEFT JOIN amenity_rating_mv mv ON mv.amenityid = a.amenityid
     """
 
     where_clauses = []
     params: List = []
+    # Each combination of filters is its own prepared statement, named after
+    # the filters it uses, so repeated pages skip parse and plan
+    shape = ["list_amenities"]
+
+    def placeholder(value, cast: str = "") -> str:
+        params.append(value)
+        return f"${len(params)}{cast}"
 
     if amenity_type:
-        where_clauses.append("a.type = %s")
-        params.append(amenity_type)
+        where_clauses.append(f"a.type = {placeholder(amenity_type)}")
+        shape.append("type")
 
-    if keyword:
-        kw = f"%{keyword.strip()}%"
+    # a.searchtsv covers building name, address, and notes (see init.sql)
+    if match == "prefix":
+        where_clauses.append(
+            f"a.searchtsv @@ to_tsquery('simple', {placeholder(term, '::text')} || ':*')"
+        )
+    elif match == "search":
+        where_clauses.append(
+            f"a.searchtsv @@ websearch_to_tsquery('simple', {placeholder(term, '::text')})"
+        )
+    elif match == "substring":
+        pattern = placeholder(like_pattern(term), "::text")
         where_clauses.append(
-            "(b.name ILIKE %s OR ad.address ILIKE %s OR a.notes ILIKE %s)"
+            f"(b.name ILIKE {pattern} OR ad.address ILIKE {pattern} OR a.notes ILIKE {pattern})"
         )
-        params.extend([kw, kw, kw])
+    if match:
+        shape.append(match)
+
+    if keyset:
+        after_avg, after_count, after_id = keyset
+        # Row-value compare against the sort key; amenityid is negated because
+        # it sorts ascending while the rating columns sort descending
+        where_clauses.append(
+            "(COALESCE(mv.avg_rating, 0)::float8, COALESCE(mv.review_count, 0), -a.amenityid)"
+            f" < ({placeholder(after_avg, '::float8')},"
+            f" {placeholder(after_count, '::bigint')},"
+            f" {placeholder(-after_id, '::int')})"
+        )
+        shape.append("keyset")
 
     if where_clauses:
         query += " WHERE " + " AND ".join(where_clauses)
 
-    query += """
-        GROUP BY
-            a.amenityid,
-            a.buildingid,
-            a.type,
-            a.floor,
-            a.notes,
-            b.buildingid,
-            b.name,
-            ad.address,
-            ad.lat,
-            ad.lon
+    query += f"""
         ORDER BY
             avg_rating DESC,
             review_count DESC,
             a.amenityid ASC
-        LIMIT %s
-        OFFSET %s
+        LIMIT {placeholder(limit, '::bigint')}
     """
 
-    params.extend([limit, offset])
+    if not keyset:
+        query += f" OFFSET {placeholder(offset, '::bigint')}"
 
-    try:
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        return rows
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    # Postgres assembles the whole page as one JSON array; the ::text cast keeps
+    # psycopg2 from parsing it, so the handler just forwards the bytes
+    name = "_".join(shape)
+    # The row count and the last row's sort key come back alongside the JSON
+    # so the handler can hand out a next-page cursor without parsing the body
+    PREPARED_SQL.setdefault(name, f"""
+        SELECT
+            COALESCE(
+                json_agg(page ORDER BY page.avg_rating DESC, page.review_count DESC, page.amenityid),
+                '[]'::json
+            )::text,
+            COUNT(*),
+            (array_agg(
+                json_build_array(page.avg_rating, page.review_count, page.amenityid)::text
+                ORDER BY page.avg_rating, page.review_count, page.amenityid DESC
+            ))[1]
+        FROM ({query}) page
+    """)
+    return name, tuple(params)
+
+
+@app.get("/amenities")
+def list_amenities(
+    conn: DbConn,
+    keyword: Optional[str] = Query(
+        default=None,
+        description="Search across building name, address, and amenity notes.",
+    ),
+    amenity_type: Optional[str] = Query(
+        default=None,
+        description="Filter by amenity type: Bathroom, WaterFountain, VendingMachine.",
+    ),
+    limit: int = Query(default=50, ge=1, le=1500),
+    offset: int = Query(default=0, ge=0),
+    after_avg: Optional[float] = Query(
+        default=None,
+        description="Keyset paging: avg_rating of the last row on the previous page.",
+    ),
+    after_count: Optional[int] = Query(
+        default=None,
+        description="Keyset paging: review_count of the last row on the previous page.",
+    ),
+    after_id: Optional[int] = Query(
+        default=None,
+        description="Keyset paging: amenityid of the last row on the previous page.",
+    ),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="Keyset paging: the X-Next-Cursor header of the previous page.",
+    ),
+):
+    """
+    List amenities with optional keyword search and type filter.
+    Returns building name, address, amenity info, and average rating.
+    Full pages carry an X-Next-Cursor header; pass it back as ?cursor= (or the
+    last row's avg_rating, review_count, amenityid as after_*) to fetch the next
+    page without the cost of a deep OFFSET.
+    """
+    keyset = (after_avg, after_count, after_id)
+    use_keyset = any(v is not None for v in keyset)
+    if use_keyset and any(v is None for v in keyset):
+        raise HTTPException(
+            status_code=400,
+            detail="after_avg, after_count and after_id must be given together",
+        )
+    if cursor is not None:
+        if use_keyset:
+            raise HTTPException(
+                status_code=400, detail="Use either cursor or after_* paging, not both"
+            )
+        keyset = decode_cursor(cursor, (float, int, int))
+        use_keyset = True
+    if use_keyset and offset:
+        raise HTTPException(
+            status_code=400, detail="Use either offset or keyset paging, not both"
+        )
+    keyset = keyset if use_keyset else None
+
+    term = keyword.strip() if keyword else None
+    match = None
+    if term:
+        if not WORD_CHAR_RE.search(term):
+            match = "substring"
+        elif SINGLE_WORD_RE.match(term):
+            match = "prefix"
+        else:
+            match = "search"
+
+    cur = conn.cursor(cursor_factory=TupleCursor)
+    name, params = build_amenity_page_query(
+        match, term, amenity_type, keyset, limit, offset
+    )
+    execute_prepared(cur, name, params)
+    body, row_count, last_key = cur.fetchone()
+
+    if body == "[]" and match in ("prefix", "search") and len(term) >= SUBSTRING_MIN_LENGTH:
+        # Only fall back when full-text search matches nothing at all, so
+        # later pages of a full-text result never switch to substring rows
+        if keyset or offset:
+            name, params = build_amenity_page_query(
+                match, term, amenity_type, None, 1, 0
+            )
+            execute_prepared(cur, name, params)
+            fts_has_matches = cur.fetchone()[0] != "[]"
+        else:
+            fts_has_matches = False
+
+        if not fts_has_matches:
+            name, params = build_amenity_page_query(
+                "substring", term, amenity_type, keyset, limit, offset
+            )
+            execute_prepared(cur, name, params)
+            body, row_count, last_key = cur.fetchone()
+
+    headers = {}
+    if row_count == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(json.loads(last_key))
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 # -------------------------------------------------------
 # GET /amenities/{amenity_id} - single amenity details
 # -------------------------------------------------------
 @app.get("/amenities/{amenity_id}")
-def get_amenity(amenity_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT
-                a.amenityid,
-                a.buildingid,
-                a.type,
-                a.floor,
-                a.notes,
-                b.name      AS building_name,
-                ad.address  AS address,
-                ad.lat,
-                ad.lon
-            FROM amenity a
-            JOIN building b ON a.buildingid = b.buildingid
-            JOIN address ad ON b.addressid = ad.addressid
-            WHERE a.amenityid = %s
-            """,
-            (amenity_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Amenity not found")
-        return row
-    finally:
-        conn.close()
+def get_amenity(amenity_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    execute_prepared(cur, "get_amenity", (amenity_id,))
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Amenity not found")
+    return row
 
 
 # ---------------------------------
 # POST /amenities - Create amenity
 # ---------------------------------
 @app.post("/amenities")
-def create_amenity(payload: AmenityCreate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO amenity (buildingid, type, floor, notes)
-            VALUES (%s, %s, %s, %s)
-            RETURNING amenityid, buildingid, type, floor, notes
-            """,
-            (payload.building_id, payload.type, payload.floor, payload.notes),
-        )
-        row = cur.fetchone()
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+def create_amenity(payload: AmenityCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        INSERT INTO amenity (buildingid, type, floor, notes)
+        VALUES (%s, %s, %s, %s)
+        RETURNING amenityid, buildingid, type, floor, notes
+        """,
+        (payload.building_id, payload.type, payload.floor, payload.notes),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    return row
 
 
 # -----------------------------------------
 # PUT /amenities/{amenity_id} - Update amenity
 # -----------------------------------------
 @app.put("/amenities/{amenity_id}")
-def update_amenity(amenity_id: int, payload: AmenityUpdate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        set_clauses = []
-        params: List = []
-
-        if payload.building_id is not None:
-            set_clauses.append("buildingid = %s")
-            params.append(payload.building_id)
-        if payload.type is not None:
-            set_clauses.append("type = %s")
-            params.append(payload.type)
-        if payload.floor is not None:
-            set_clauses.append("floor = %s")
-            params.append(payload.floor)
-        if payload.notes is not None:
-            set_clauses.append("notes = %s")
-            params.append(payload.notes)
-
-        if not set_clauses:
-            raise HTTPException(status_code=400, detail="No fields provided to update")
-
-        params.append(amenity_id)
-        query = f"""
-            UPDATE amenity
-            SET {", ".join(set_clauses)}
-            WHERE amenityid = %s
-            RETURNING amenityid, buildingid, type, floor, notes
-        """
+def update_amenity(amenity_id: int, payload: AmenityUpdate, conn: DbConn):
+    cur = conn.shared_cursor()
+    set_clauses = []
+    params: List = []
 
-        cur.execute(query, params)
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="Amenity not found")
+    if payload.building_id is not None:
+        set_clauses.append("buildingid = %s")
+        params.append(payload.building_id)
+    if payload.type is not None:
+        set_clauses.append("type = %s")
+        params.append(payload.type)
+    if payload.floor is not None:
+        set_clauses.append("floor = %s")
+        params.append(payload.floor)
+    if payload.notes is not None:
+        set_clauses.append("notes = %s")
+        params.append(payload.notes)
+
+    if not set_clauses:
+        raise HTTPException(status_code=400, detail="No fields provided to update")
+
+    params.append(amenity_id)
+    query = f"""
+        UPDATE amenity
+        SET {", ".join(set_clauses)}
+        WHERE amenityid = %s
+        RETURNING amenityid, buildingid, type, floor, notes
+    """
 
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    cur.execute(query, params)
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Amenity not found")
+
+    conn.commit()
+    return row
 
 
 # --------------------------------------------
 # DELETE /amenities/{amenity_id} - Delete amenity
 # --------------------------------------------
 @app.delete("/amenities/{amenity_id}")
-def delete_amenity(amenity_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        # First, verify the amenity exists
-        cur.execute(
-            "SELECT amenityid FROM amenity WHERE amenityid = %s",
-            (amenity_id,),
-        )
-        if not cur.fetchone():
-            raise HTTPException(status_code=404, detail="Amenity not found")
-        
-        # Delete reviews first (they have a foreign key to amenity)
-        cur.execute(
-            "DELETE FROM review WHERE amenityid = %s",
-            (amenity_id,),
-        )
-        reviews_deleted = cur.rowcount
-        
-        # Delete amenity-tag relationships (these have CASCADE, but explicit is cleaner)
-        cur.execute(
-            "DELETE FROM amenitytag WHERE amenityid = %s",
-            (amenity_id,),
-        )
-        
-        # Now delete the amenity
-        cur.execute(
-            """
-            DELETE FROM amenity
-            WHERE amenityid = %s
-            RETURNING amenityid
-            """,
-            (amenity_id,),
+def delete_amenity(amenity_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    # One round trip: the CTE removes the reviews (they have a foreign key
+    # to amenity), amenity-tag rows go via ON DELETE CASCADE, and foreign
+    # keys are checked once the whole statement has run
+    cur.execute(
+        """
+        WITH deleted_reviews AS (
+            DELETE FROM review
+            WHERE amenityid = %(amenity_id)s
+            RETURNING reviewid
         )
-        row = cur.fetchone()
-        if not row:
+        DELETE FROM amenity
+        WHERE amenityid = %(amenity_id)s
+        RETURNING
+            amenityid,
+            (SELECT COUNT(*) FROM deleted_reviews) AS reviews_deleted
+        """,
+        {"amenity_id": amenity_id},
+    )
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Amenity not found")
+
+    conn.commit()
+    return {
+        "deleted_amenity_id": row["amenityid"],
+        "reviews_deleted": row["reviews_deleted"]
+    }
+
+
+# Rows pulled per round trip by stream_json_rows' server-side cursor; a list that
+# fits in one batch is sent after its connection is back in the pool
+STREAM_FETCH_SIZE = 200
+
+
+def stream_json_rows(statement: str, params: tuple):
+    """
+    Generate a PREPARED_SQL query's rows as a JSON array, one chunk per batch
+    read from a server-side cursor. Start it through json_stream_response, which
+    pulls the first chunk (connection, query and first batch) before any
+    headers go out. The closing chunk is produced after the connection is
+    released.
+    """
+    with get_conn() as conn:
+        cur = conn.cursor(name=f"stream_{statement}")
+        try:
+            execute_plain(cur, statement, params)
+            chunk, sep = b"[", b""
+            batch = cur.fetchmany(STREAM_FETCH_SIZE)
+            while len(batch) == STREAM_FETCH_SIZE:
+                yield chunk + sep + b",".join(map(orjson.dumps, batch))
+                chunk, sep = b"", b","
+                batch = cur.fetchmany(STREAM_FETCH_SIZE)
+            if batch:
+                chunk += sep + b",".join(map(orjson.dumps, batch))
+        finally:
+            cur.close()
             conn.rollback()
-            raise HTTPException(status_code=404, detail="Amenity not found after deletion attempt")
+    yield chunk + b"]"
 
-        conn.commit()
-        return {
-            "deleted_amenity_id": row["amenityid"],
-            "reviews_deleted": reviews_deleted
-        }
-    except HTTPException:
-        conn.rollback()
-        raise
+
+def json_stream_response(statement: str, params: tuple) -> StreamingResponse:
+    """
+    Stream a PREPARED_SQL query as a JSON array. The first chunk is produced
+    here, in the handler, so a busy pool (503) or a failing query (400) is
+    reported as a status code instead of cutting off a 200.
+    """
+    chunks = stream_json_rows(statement, params)
+    try:
+        first = next(chunks)
     except psycopg2.Error as e:
-        conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    return StreamingResponse(
+        itertools.chain((first,), chunks), media_type="application/json"
+    )
 
 
 # ----------------------------------------------------------------
 # GET /amenities/{amenity_id}/reviews - list reviews for amenity
 # ----------------------------------------------------------------
 @app.get("/amenities/{amenity_id}/reviews")
-def get_reviews_for_amenity(amenity_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT
-                reviewid,
-                userid,
-                amenityid,
-                overallrating,
-                ratingdetails,
-                timestamp
-            FROM review
-            WHERE amenityid = %s
-            ORDER BY timestamp DESC
-            """,
-            (amenity_id,),
-        )
-        rows = cur.fetchall()
-        return rows
-    finally:
-        conn.close()
+def get_reviews_for_amenity(
+    amenity_id: int,
+    include_details: bool = Query(
+        default=False,
+        description="Include each review's ratingdetails JSON.",
+    ),
+):
+    statement = (
+        "get_reviews_for_amenity" if include_details else "get_review_summaries_for_amenity"
+    )
+    return json_stream_response(statement, (amenity_id,))
 
 
 # ---------------------------------
 # POST /reviews - Create a review
 # ---------------------------------
 @app.post("/reviews")
-def create_review(review: ReviewCreate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO review (userid, amenityid, overallrating, ratingdetails)
-            VALUES (%s, %s, %s, %s)
-            RETURNING reviewid, timestamp
-            """,
-            (
-                review.user_id,
-                review.amenity_id,
-                review.overall_rating,
-                Json(review.rating_details),
-            ),
-        )
-        row = cur.fetchone()
-        conn.commit()
-        return {
-            "review_id": row["reviewid"],
-            "timestamp": row["timestamp"],
-        }
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+def create_review(review: ReviewCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+    execute_prepared(
+        cur,
+        "create_review",
+        (
+            review.user_id,
+            review.amenity_id,
+            review.overall_rating,
+            Json(review.rating_details),
+        ),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    return {
+        "review_id": row["reviewid"],
+        "timestamp": row["timestamp"],
+        "amenity_id": review.amenity_id,
+        "avg_rating": row["avg_rating"],
+        "review_count": row["review_count"],
+    }
 
 
 # ----------------------------------------
 # GET /reviews/{review_id} - Read a review
 # ----------------------------------------
 @app.get("/reviews/{review_id}")
-def get_review(review_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT
-                reviewid,
-                userid,
-                amenityid,
-                overallrating,
-                ratingdetails,
-                timestamp
-            FROM review
-            WHERE reviewid = %s
-            """,
-            (review_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Review not found")
-        return row
-    finally:
-        conn.close()
+def get_review(review_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    execute_prepared(cur, "get_review", (review_id,))
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Review not found")
+    return row
 
 
 # -----------------------------------------
 # PUT /reviews/{review_id} - Update review
 # -----------------------------------------
 @app.put("/reviews/{review_id}")
-def update_review(review_id: int, update: ReviewUpdate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        set_clauses = []
-        params: List = []
-
-        if update.overall_rating is not None:
-            set_clauses.append("overallrating = %s")
-            params.append(update.overall_rating)
-
-        if update.rating_details is not None:
-            set_clauses.append("ratingdetails = %s")
-            params.append(Json(update.rating_details))
-
-        if not set_clauses:
-            raise HTTPException(
-                status_code=400, detail="No fields provided to update"
-            )
-
-        params.append(review_id)
-        query = f"""
-            UPDATE review
-            SET {", ".join(set_clauses)}
-            WHERE reviewid = %s
-            RETURNING
-                reviewid,
-                userid,
-                amenityid,
-                overallrating,
-                ratingdetails,
-                timestamp
-        """
+def update_review(review_id: int, update: ReviewUpdate, conn: DbConn):
+    cur = conn.shared_cursor()
+    if update.overall_rating is None and update.rating_details is None:
+        raise HTTPException(
+            status_code=400, detail="No fields provided to update"
+        )
 
-        cur.execute(query, params)
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="Review not found")
+    # One static statement for every update shape: NULL keeps the old value
+    execute_prepared(
+        cur,
+        "update_review",
+        (
+            update.overall_rating,
+            Json(update.rating_details) if update.rating_details is not None else None,
+            review_id,
+        ),
+    )
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Review not found")
 
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    conn.commit()
+    return row
 
 
 # --------------------------------------------
 # DELETE /reviews/{review_id} - Delete review
 # --------------------------------------------
 @app.delete("/reviews/{review_id}")
-def delete_review(review_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            DELETE FROM review
-            WHERE reviewid = %s
-            RETURNING reviewid
-            """,
-            (review_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="Review not found")
+def delete_review(review_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    execute_prepared(cur, "delete_review", (review_id,))
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Review not found")
 
-        conn.commit()
-        return {"deleted_review_id": row["reviewid"]}
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    conn.commit()
+    return {"deleted_review_id": row["reviewid"]}
 
 
 # -----------------------------------------------
-# POST /reviews/upsert - Call stored procedure
+# POST /reviews/upsert - Insert or update a review
 # -----------------------------------------------
 @app.post("/reviews/upsert")
-def upsert_review(review: ReviewCreate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "CALL sp_upsert_review(%s, %s, %s, %s)",
-            (
-                review.user_id,
-                review.amenity_id,
-                review.overall_rating,
-                Json(review.rating_details),
-            ),
-        )
-        conn.commit()
-        return {"message": "Review upserted successfully"}
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+def upsert_review(review: ReviewCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+    # Same effect as CALL sp_upsert_review, in one statement that
+    # also hands back the affected row
+    execute_prepared(
+        cur,
+        "upsert_review",
+        (
+            review.user_id,
+            review.amenity_id,
+            review.overall_rating,
+            Json(review.rating_details),
+        ),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    return {
+        "message": "Review upserted successfully",
+        "review_id": row["reviewid"],
+        "timestamp": row["timestamp"],
+    }
 
 
 # -----------------------------------------
@@ -576,135 +1168,108 @@ def upsert_review(review: ReviewCreate):
 # -----------------------------------------
 
 @app.post("/users")
-def create_user(user: UserCreate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO "User" (UserName, Email)
-            VALUES (%s, %s)
-            RETURNING UserId, UserName, Email, JoinDate
-            """,
-            (user.username, user.email),
-        )
-        row = cur.fetchone()
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+def create_user(user: UserCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        INSERT INTO "User" (UserName, Email)
+        VALUES (%s, %s)
+        RETURNING UserId, UserName, Email, JoinDate
+        """,
+        (user.username, user.email),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    return row
 
 
 @app.get("/users")
-def list_users(limit: int = Query(default=50, ge=1, le=500), offset: int = Query(0, ge=0)):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT UserId, UserName, Email, JoinDate
-            FROM "User"
-            ORDER BY UserId
-            LIMIT %s OFFSET %s
-            """,
-            (limit, offset),
+def list_users(
+    conn: DbConn,
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="Keyset paging: the X-Next-Cursor header of the previous page.",
+    ),
+):
+    if cursor is not None and offset:
+        raise HTTPException(
+            status_code=400, detail="Use either offset or cursor paging, not both"
         )
-        rows = cur.fetchall()
-        return rows
-    finally:
-        conn.close()
+
+    cur = conn.shared_cursor()
+    if cursor is not None:
+        (after_id,) = decode_cursor(cursor, (int,))
+        execute_prepared(cur, "list_users_after", (after_id, limit))
+    else:
+        execute_prepared(cur, "list_users", (limit, offset))
+    rows = cur.fetchall()
+    return ORJSONResponse(
+        rows, headers=next_cursor_headers(rows, limit, lambda r: [r["userid"]])
+    )
 
 
 @app.get("/users/{user_id}")
-def get_user(user_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT UserId, UserName, Email, JoinDate
-            FROM "User"
-            WHERE UserId = %s
-            """,
-            (user_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="User not found")
-        return row
-    finally:
-        conn.close()
+def get_user(user_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    execute_prepared(cur, "get_user", (user_id,))
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    return row
 
 
 @app.put("/users/{user_id}")
-def update_user(user_id: int, payload: UserUpdate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        set_clauses = []
-        params: List = []
-
-        if payload.username is not None:
-            set_clauses.append("UserName = %s")
-            params.append(payload.username)
-        if payload.email is not None:
-            set_clauses.append("Email = %s")
-            params.append(payload.email)
-
-        if not set_clauses:
-            raise HTTPException(status_code=400, detail="No fields provided to update")
-
-        params.append(user_id)
-        query = f"""
-            UPDATE "User"
-            SET {", ".join(set_clauses)}
-            WHERE UserId = %s
-            RETURNING UserId, UserName, Email, JoinDate
-        """
+def update_user(user_id: int, payload: UserUpdate, conn: DbConn):
+    cur = conn.shared_cursor()
+    set_clauses = []
+    params: List = []
 
-        cur.execute(query, params)
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="User not found")
+    if payload.username is not None:
+        set_clauses.append("UserName = %s")
+        params.append(payload.username)
+    if payload.email is not None:
+        set_clauses.append("Email = %s")
+        params.append(payload.email)
+
+    if not set_clauses:
+        raise HTTPException(status_code=400, detail="No fields provided to update")
+
+    params.append(user_id)
+    query = f"""
+        UPDATE "User"
+        SET {", ".join(set_clauses)}
+        WHERE UserId = %s
+        RETURNING UserId, UserName, Email, JoinDate
+    """
 
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    cur.execute(query, params)
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    conn.commit()
+    return row
 
 
 @app.delete("/users/{user_id}")
-def delete_user(user_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            DELETE FROM "User"
-            WHERE UserId = %s
-            RETURNING UserId
-            """,
-            (user_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="User not found")
+def delete_user(user_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        DELETE FROM "User"
+        WHERE UserId = %s
+        RETURNING UserId
+        """,
+        (user_id,),
+    )
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        conn.commit()
-        return {"deleted_user_id": row["userid"]}
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    conn.commit()
+    return {"deleted_user_id": row["userid"]}
 
 
 # -----------------------------------------
@@ -712,193 +1277,131 @@ def delete_user(user_id: int):
 # -----------------------------------------
 
 @app.get("/buildings")
-def list_buildings(limit: int = Query(default=200, ge=1, le=2000), offset: int = Query(0, ge=0)):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT
-                b.buildingid,
-                b.name,
-                ad.address,
-                ad.lat,
-                ad.lon
-            FROM building b
-            JOIN address ad ON b.addressid = ad.addressid
-            ORDER BY b.name
-            LIMIT %s OFFSET %s
-            """,
-            (limit, offset),
+def list_buildings(
+    conn: DbConn,
+    limit: int = Query(default=200, ge=1, le=2000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="Keyset paging: the X-Next-Cursor header of the previous page.",
+    ),
+):
+    if cursor is not None and offset:
+        raise HTTPException(
+            status_code=400, detail="Use either offset or cursor paging, not both"
         )
-        rows = cur.fetchall()
-        return rows
-    finally:
-        conn.close()
+
+    cur = conn.shared_cursor()
+    if cursor is not None:
+        after_name, after_id = decode_cursor(cursor, (str, int))
+        execute_prepared(cur, "list_buildings_after", (after_name, after_id, limit))
+    else:
+        execute_prepared(cur, "list_buildings", (limit, offset))
+    rows = cur.fetchall()
+    return ORJSONResponse(
+        rows,
+        headers=next_cursor_headers(rows, limit, lambda r: [r["name"], r["buildingid"]]),
+    )
 
 
 @app.get("/buildings/{building_id}")
-def get_building(building_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT
-                b.buildingid,
-                b.name,
-                ad.address,
-                ad.lat,
-                ad.lon
-            FROM building b
-            JOIN address ad ON b.addressid = ad.addressid
-            WHERE b.buildingid = %s
-            """,
-            (building_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Building not found")
-        return row
-    finally:
-        conn.close()
+def get_building(building_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    execute_prepared(cur, "get_building", (building_id,))
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Building not found")
+    return row
 
 
 @app.post("/buildings")
-def create_building(payload: BuildingCreate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO building (name, addressid)
-            VALUES (%s, %s)
-            RETURNING buildingid, name, addressid
-            """,
-            (payload.name, payload.address_id),
-        )
-        row = cur.fetchone()
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+def create_building(payload: BuildingCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        INSERT INTO building (name, addressid)
+        VALUES (%s, %s)
+        RETURNING buildingid, name, addressid
+        """,
+        (payload.name, payload.address_id),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    return row
 
 
 @app.put("/buildings/{building_id}")
-def update_building(building_id: int, payload: BuildingUpdate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        set_clauses = []
-        params: List = []
-
-        if payload.name is not None:
-            set_clauses.append("name = %s")
-            params.append(payload.name)
-        if payload.address_id is not None:
-            set_clauses.append("addressid = %s")
-            params.append(payload.address_id)
-
-        if not set_clauses:
-            raise HTTPException(status_code=400, detail="No fields provided to update")
-
-        params.append(building_id)
-        query = f"""
-            UPDATE building
-            SET {", ".join(set_clauses)}
-            WHERE buildingid = %s
-            RETURNING buildingid, name, addressid
-        """
+def update_building(building_id: int, payload: BuildingUpdate, conn: DbConn):
+    cur = conn.shared_cursor()
+    set_clauses = []
+    params: List = []
 
-        cur.execute(query, params)
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="Building not found")
+    if payload.name is not None:
+        set_clauses.append("name = %s")
+        params.append(payload.name)
+    if payload.address_id is not None:
+        set_clauses.append("addressid = %s")
+        params.append(payload.address_id)
+
+    if not set_clauses:
+        raise HTTPException(status_code=400, detail="No fields provided to update")
+
+    params.append(building_id)
+    query = f"""
+        UPDATE building
+        SET {", ".join(set_clauses)}
+        WHERE buildingid = %s
+        RETURNING buildingid, name, addressid
+    """
 
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    cur.execute(query, params)
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Building not found")
+
+    conn.commit()
+    return row
 
 
 @app.delete("/buildings/{building_id}")
-def delete_building(building_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        # First, verify the building exists
-        cur.execute(
-            "SELECT buildingid FROM building WHERE buildingid = %s",
-            (building_id,),
-        )
-        if not cur.fetchone():
-            raise HTTPException(status_code=404, detail="Building not found")
-        
-        # Get all amenities for this building
-        cur.execute(
-            "SELECT amenityid FROM amenity WHERE buildingid = %s",
-            (building_id,),
-        )
-        amenity_ids = [row["amenityid"] for row in cur.fetchall()]
-        amenities_deleted = len(amenity_ids)
-        
-        # Delete reviews for all amenities in this building
-        reviews_deleted = 0
-        for amenity_id in amenity_ids:
-            cur.execute(
-                "DELETE FROM review WHERE amenityid = %s",
-                (amenity_id,),
-            )
-            reviews_deleted += cur.rowcount
-        
-        # Delete amenity-tag relationships for all amenities
-        for amenity_id in amenity_ids:
-            cur.execute(
-                "DELETE FROM amenitytag WHERE amenityid = %s",
-                (amenity_id,),
-            )
-        
-        # Delete all amenities for this building
-        cur.execute(
-            "DELETE FROM amenity WHERE buildingid = %s",
-            (building_id,),
-        )
-        
-        # Now delete the building
-        cur.execute(
-            """
-            DELETE FROM building
-            WHERE buildingid = %s
-            RETURNING buildingid
-            """,
-            (building_id,),
+def delete_building(building_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    # One round trip instead of two statements per amenity: reviews and
+    # amenities are removed in CTEs, amenity-tag rows via ON DELETE
+    # CASCADE, and foreign keys are checked once the statement has run
+    cur.execute(
+        """
+        WITH deleted_reviews AS (
+            DELETE FROM review r
+            USING amenity a
+            WHERE r.amenityid = a.amenityid
+              AND a.buildingid = %(building_id)s
+            RETURNING r.reviewid
+        ),
+        deleted_amenities AS (
+            DELETE FROM amenity
+            WHERE buildingid = %(building_id)s
+            RETURNING amenityid
         )
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="Building not found after deletion attempt")
-
-        conn.commit()
-        return {
-            "deleted_building_id": row["buildingid"],
-            "amenities_deleted": amenities_deleted,
-            "reviews_deleted": reviews_deleted
-        }
-    except HTTPException:
-        conn.rollback()
-        raise
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+        DELETE FROM building
+        WHERE buildingid = %(building_id)s
+        RETURNING
+            buildingid,
+            (SELECT COUNT(*) FROM deleted_amenities) AS amenities_deleted,
+            (SELECT COUNT(*) FROM deleted_reviews) AS reviews_deleted
+        """,
+        {"building_id": building_id},
+    )
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Building not found")
+
+    conn.commit()
+    return {
+        "deleted_building_id": row["buildingid"],
+        "amenities_deleted": row["amenities_deleted"],
+        "reviews_deleted": row["reviews_deleted"]
+    }
 
 
 # -----------------------------------------
@@ -906,102 +1409,75 @@ def delete_building(building_id: int):
 # -----------------------------------------
 
 @app.post("/tags")
-def create_tag(payload: TagCreate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO tag (label)
-            VALUES (%s)
-            RETURNING tagid, label
-            """,
-            (payload.label,),
-        )
-        row = cur.fetchone()
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+def create_tag(payload: TagCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        INSERT INTO tag (label)
+        VALUES (%s)
+        RETURNING tagid, label
+        """,
+        (payload.label,),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    return row
 
 
 @app.get("/tags")
-def list_tags():
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT tagid, label
-            FROM tag
-            ORDER BY label
-            """
-        )
-        rows = cur.fetchall()
-        return rows
-    finally:
-        conn.close()
+def list_tags(conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        SELECT tagid, label
+        FROM tag
+        ORDER BY label
+        """
+    )
+    rows = cur.fetchall()
+    return ORJSONResponse(rows)
 
 
 @app.put("/tags/{tag_id}")
-def update_tag(tag_id: int, payload: TagUpdate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        if payload.label is None:
-            raise HTTPException(status_code=400, detail="No fields provided to update")
-
-        cur.execute(
-            """
-            UPDATE tag
-            SET label = %s
-            WHERE tagid = %s
-            RETURNING tagid, label
-            """,
-            (payload.label, tag_id),
-        )
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="Tag not found")
+def update_tag(tag_id: int, payload: TagUpdate, conn: DbConn):
+    cur = conn.shared_cursor()
+    if payload.label is None:
+        raise HTTPException(status_code=400, detail="No fields provided to update")
 
-        conn.commit()
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    cur.execute(
+        """
+        UPDATE tag
+        SET label = %s
+        WHERE tagid = %s
+        RETURNING tagid, label
+        """,
+        (payload.label, tag_id),
+    )
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Tag not found")
+
+    conn.commit()
+    return row
 
 
 @app.delete("/tags/{tag_id}")
-def delete_tag(tag_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            DELETE FROM tag
-            WHERE tagid = %s
-            RETURNING tagid
-            """,
-            (tag_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="Tag not found")
+def delete_tag(tag_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        DELETE FROM tag
+        WHERE tagid = %s
+        RETURNING tagid
+        """,
+        (tag_id,),
+    )
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Tag not found")
 
-        conn.commit()
-        return {"deleted_tag_id": row["tagid"]}
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    conn.commit()
+    return {"deleted_tag_id": row["tagid"]}
 
 
 # -----------------------------------------
@@ -1009,166 +1485,250 @@ def delete_tag(tag_id: int):
 # -----------------------------------------
 
 @app.post("/amenities/{amenity_id}/tags")
-def attach_tag_to_amenity(amenity_id: int, payload: AmenityTagCreate):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO amenitytag (amenityid, tagid)
-            VALUES (%s, %s)
-            ON CONFLICT (amenityid, tagid) DO NOTHING
-            RETURNING amenityid, tagid
-            """,
-            (amenity_id, payload.tag_id),
-        )
-        row = cur.fetchone()
-        conn.commit()
-        # If row is None, it already existed
-        if not row:
-            return {"message": "Tag already attached to amenity"}
-        return row
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+def attach_tag_to_amenity(amenity_id: int, payload: AmenityTagCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        INSERT INTO amenitytag (amenityid, tagid)
+        VALUES (%s, %s)
+        ON CONFLICT (amenityid, tagid) DO NOTHING
+        RETURNING amenityid, tagid
+        """,
+        (amenity_id, payload.tag_id),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    # If row is None, it already existed
+    if not row:
+        return {"message": "Tag already attached to amenity"}
+    return row
 
 
 @app.delete("/amenities/{amenity_id}/tags/{tag_id}")
-def detach_tag_from_amenity(amenity_id: int, tag_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            DELETE FROM amenitytag
-            WHERE amenityid = %s AND tagid = %s
-            RETURNING amenityid, tagid
-            """,
-            (amenity_id, tag_id),
-        )
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise HTTPException(status_code=404, detail="Amenity-tag relationship not found")
+def detach_tag_from_amenity(amenity_id: int, tag_id: int, conn: DbConn):
+    cur = conn.shared_cursor()
+    cur.execute(
+        """
+        DELETE FROM amenitytag
+        WHERE amenityid = %s AND tagid = %s
+        RETURNING amenityid, tagid
+        """,
+        (amenity_id, tag_id),
+    )
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Amenity-tag relationship not found")
 
-        conn.commit()
-        return {"removed_amenity_id": row["amenityid"], "removed_tag_id": row["tagid"]}
-    except psycopg2.Error as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    conn.commit()
+    return {"removed_amenity_id": row["amenityid"], "removed_tag_id": row["tagid"]}
 
 
 # ----------------------------------------------------------------
 # Leaderboard Endpoints - Advanced SQL Queries
 # ----------------------------------------------------------------
 
+# Leaderboards take no parameters, so each endpoint caches its one result for
+# this many seconds; each refresh of the leaderboard views invalidates it early
+LEADERBOARD_TTL = 60
+LEADERBOARD_KEY_PREFIX = "leaderboard:"
+# Bumped on every invalidation (outside the prefix, so the key sweep keeps it).
+# A miss WATCHes it while its query runs, and does not store what it read if an
+# invalidation landed in the meantime.
+LEADERBOARD_GENERATION_KEY = "leaderboard-generation"
+
+# Shared across workers when REDIS_URL is set; otherwise each process keeps its
+# own TTLCache per leaderboard
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client = (
+    redis.Redis.from_url(REDIS_URL, socket_timeout=1) if redis and REDIS_URL else None
+)
+
+leaderboard_caches: dict = {}
+leaderboard_cache_lock = threading.Lock()
+# In-process counterpart of LEADERBOARD_GENERATION_KEY, guarded by the lock
+local_leaderboard_generation = 0
+
+
+def cached_leaderboard(ttl: int = LEADERBOARD_TTL):
+    """
+    Cache-aside for a leaderboard's JSON body: serve it from Redis (or the
+    in-process TTL cache) and run the query only on a miss. Redis errors fall
+    back to the query.
+    """
+    def decorator(func):
+        key = LEADERBOARD_KEY_PREFIX + func.__name__
+        local_cache = leaderboard_caches[key] = TTLCache(maxsize=1, ttl=ttl)
+
+        def load():
+            if redis_client is not None:
+                body = None
+                try:
+                    body = redis_client.get(key)
+                    if body is not None:
+                        return body
+                    with redis_client.pipeline() as pipe:
+                        pipe.watch(LEADERBOARD_GENERATION_KEY)
+                        body = func()
+                        pipe.multi()
+                        pipe.set(key, body, ex=ttl)
+                        pipe.execute()
+                    return body
+                except redis.WatchError:
+                    # Invalidated while the query ran: serve it, but don't cache it
+                    return body
+                except redis.RedisError as e:
+                    logger.warning("Leaderboard cache unavailable: %s", e)
+                    return func() if body is None else body
+
+            with leaderboard_cache_lock:
+                generation = local_leaderboard_generation
+            body = func()
+            with leaderboard_cache_lock:
+                if generation == local_leaderboard_generation:
+                    local_cache[key] = body
+            return body
+
+        # Async so an in-process cache hit is answered on the event loop without
+        # a threadpool hop; Redis and Postgres calls block, so they go to a thread
+        @functools.wraps(func)
+        async def wrapper():
+            body = None
+            if redis_client is None:
+                with leaderboard_cache_lock:
+                    body = local_cache.get(key)
+            if body is None:
+                body = await to_thread.run_sync(load)
+            # The cached value is already JSON text, sent as-is
+            return Response(content=body, media_type="application/json")
+
+        return wrapper
+
+    return decorator
+
+
+def clear_local_leaderboards():
+    global local_leaderboard_generation
+    with leaderboard_cache_lock:
+        local_leaderboard_generation += 1
+        for cache in leaderboard_caches.values():
+            cache.clear()
+
+
+def invalidate_leaderboards():
+    """
+    Drop every cached leaderboard after the leaderboard views are refreshed.
+    """
+    clear_local_leaderboards()
+    if redis_client is not None:
+        try:
+            # Bump the generation before deleting, so a miss already running
+            # against the old views fails its WATCH instead of storing them
+            redis_client.incr(LEADERBOARD_GENERATION_KEY)
+            keys = list(redis_client.scan_iter(match=LEADERBOARD_KEY_PREFIX + "*"))
+            if keys:
+                redis_client.delete(*keys)
+        except redis.RedisError as e:
+            logger.warning("Leaderboard cache invalidation failed: %s", e)
+
+
+# The rankings themselves are materialized views (see db/init.sql), kept top-15
+# and refreshed by the rating view refresher, so each read is a tiny scan
+
+# Query 1: Top 15 Buildings for Clean Bathrooms AND a Vending Machine
+CLEAN_BATHROOMS_VENDING_SQL = """
+    SELECT building_name, amenity_type, avg_bathroom_rating, address
+    FROM mv_leaderboard_bathrooms_vending
+    ORDER BY rank
+"""
+
+# Query 2: Coldest Water Fountain Ranking - Top 15 Fountains
+COLDEST_FOUNTAINS_SQL = """
+    SELECT building_name, floor, notes, avg_rating, cold_tag_count
+    FROM mv_leaderboard_coldest_fountains
+    ORDER BY rank
+"""
+
+# Query 4: Overall Amenity Ranking by Rating (Top 15)
+OVERALL_AMENITIES_SQL = """
+    SELECT building_name, type, floor, avg_rating, review_count
+    FROM mv_leaderboard_overall
+    ORDER BY rank
+"""
+
+# All three rankings in one statement / one round trip
+ALL_LEADERBOARDS_SQL = f"""
+    WITH
+        clean_bathrooms_vending AS ({CLEAN_BATHROOMS_VENDING_SQL}),
+        coldest_fountains AS ({COLDEST_FOUNTAINS_SQL}),
+        overall_amenities AS ({OVERALL_AMENITIES_SQL})
+    SELECT json_build_object(
+        'clean_bathrooms_vending',
+        COALESCE((SELECT json_agg(x) FROM clean_bathrooms_vending x), '[]'::json),
+        'coldest_fountains',
+        COALESCE((SELECT json_agg(x) FROM coldest_fountains x), '[]'::json),
+        'overall_amenities',
+        COALESCE((SELECT json_agg(x) FROM overall_amenities x), '[]'::json)
+    )::text AS result
+"""
+
+
+def json_array_sql(query: str) -> str:
+    """
+    Wrap a row query so Postgres returns its rows as one JSON array (as text).
+    """
+    return f"SELECT COALESCE(json_agg(x), '[]'::json)::text FROM ({query}) x"
+
+
+def fetch_leaderboard(query: str) -> str:
+    """
+    Run a query that yields a single JSON text value. The ::text casts keep
+    psycopg2 from decoding it, so no Python row objects are built.
+    """
+    with get_conn() as conn:
+        cur = conn.cursor(cursor_factory=TupleCursor)
+        try:
+            cur.execute(query)
+            return cur.fetchone()[0]
+        except psycopg2.Error as e:
+            conn.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/leaderboard/clean-bathrooms-vending")
+@cached_leaderboard(ttl=60)
 def leaderboard_clean_bathrooms_vending():
     """
     Query 1: Top 15 Buildings for Clean Bathrooms AND a Vending Machine
     """
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        query = """
-            SELECT
-                B.Name AS building_name,
-                A.Type AS amenity_type,
-                ROUND(CAST(AVG(R.OverallRating) AS NUMERIC), 2) AS avg_bathroom_rating,
-                A_D.Address AS address
-            FROM Building B
-            JOIN Amenity A ON B.BuildingId = A.BuildingId
-            JOIN Review R ON A.AmenityId = R.AmenityId
-            JOIN Address A_D ON B.AddressId = A_D.AddressId
-            JOIN Amenity A2 ON A2.BuildingId = B.BuildingId AND A2.Type = 'VendingMachine'
-            WHERE A.Type = 'Bathroom'
-            GROUP BY B.Name, A.Type, A_D.Address
-            ORDER BY Avg_Bathroom_Rating DESC
-            LIMIT 15
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        return rows
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    return fetch_leaderboard(json_array_sql(CLEAN_BATHROOMS_VENDING_SQL))
 
 
 @app.get("/leaderboard/coldest-fountains")
+@cached_leaderboard(ttl=300)
 def leaderboard_coldest_fountains():
     """
     Query 2: Coldest Water Fountain Ranking - Top 15 Fountains
     """
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        query = """
-            SELECT
-                B.Name AS building_name,
-                A.Floor AS floor,
-                A.Notes AS notes,
-                ROUND(CAST(AVG(R.OverallRating) AS NUMERIC), 2) AS avg_rating,
-                CT.Cold_Tag_Count AS cold_tag_count
-            FROM Building B
-            JOIN Amenity A ON B.BuildingId = A.BuildingId
-            JOIN Review R ON A.AmenityId = R.AmenityId
-            JOIN (
-                SELECT A2.AmenityId, COUNT(AT.TagId) AS Cold_Tag_Count
-                FROM Amenity A2
-                JOIN AmenityTag AT ON A2.AmenityId = AT.AmenityId
-                JOIN Tag T ON AT.TagId = T.TagId
-                WHERE A2.Type = 'WaterFountain' AND T.Label = 'ColdWater'
-                GROUP BY A2.AmenityId
-            ) AS CT ON A.AmenityId = CT.AmenityId
-            GROUP BY B.Name, A.Floor, A.Notes, CT.Cold_Tag_Count
-            ORDER BY CT.Cold_Tag_Count DESC, Avg_Rating DESC
-            LIMIT 15
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        return rows
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    return fetch_leaderboard(json_array_sql(COLDEST_FOUNTAINS_SQL))
 
 
 @app.get("/leaderboard/overall-amenities")
+@cached_leaderboard(ttl=60)
 def leaderboard_overall_amenities():
     """
     Query 4: Overall Amenity Ranking by Rating (Top 15)
     """
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        query = """
-            SELECT
-                B.Name AS building_name,
-                A.Type AS type,
-                A.Floor AS floor,
-                ROUND(CAST(AVG(R.OverallRating) AS NUMERIC), 2) AS avg_rating,
-                COUNT(R.ReviewId) AS review_count
-            FROM Building B
-            JOIN Amenity A ON B.BuildingId = A.BuildingId
-            JOIN Review R ON A.AmenityId = R.AmenityId
-            GROUP BY B.Name, A.Type, A.Floor
-            ORDER BY Avg_Rating DESC, Review_Count DESC
-            LIMIT 15
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        return rows
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    return fetch_leaderboard(json_array_sql(OVERALL_AMENITIES_SQL))
 
 
+@app.get("/leaderboard/all")
+@cached_leaderboard(ttl=60)
+def leaderboard_all():
+    """
+    All three leaderboards in a single round trip, keyed by leaderboard name.
+    """
+    return fetch_leaderboard(ALL_LEADERBOARDS_SQL)
+
 
 class AmenityWithTagsCreate(BaseModel):
     building_id: int
@@ -1179,51 +1739,35 @@ class AmenityWithTagsCreate(BaseModel):
 
 
 @app.post("/amenities/with-tags")
-def create_amenity_with_tags(payload: AmenityWithTagsCreate):
-    
-    conn = get_conn()
-    cur = conn.cursor()
-    
+def create_amenity_with_tags(payload: AmenityWithTagsCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+
     try:
-        # Set autocommit to False FIRST, before any SQL statements
-        conn.set_session(autocommit=False)
-        
-        # Now we can set transaction isolation level (optional)
-        cur.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
-        
-        # Advanced Query 1: Insert the amenity
-        cur.execute(
-            """
-            INSERT INTO amenity (buildingid, type, floor, notes)
-            VALUES (%s, %s, %s, %s)
-            RETURNING amenityid
-            """,
-            (payload.building_id, payload.type, payload.floor, payload.notes),
+        # Advanced Query 1 + 2: insert the amenity and all of its tag links in
+        # one round trip, as a prepared statement
+        execute_prepared(
+            cur,
+            "create_amenity_with_tags",
+            (
+                payload.building_id,
+                payload.type,
+                payload.floor,
+                payload.notes,
+                payload.tag_ids,
+            ),
         )
         amenity_result = cur.fetchone()
         if not amenity_result:
             raise Exception("Failed to create amenity")
         amenity_id = amenity_result["amenityid"]
-        
-        # Advanced Query 2: Insert multiple amenity-tag relationships
-        inserted_tags = []
-        for tag_id in payload.tag_ids:
-            cur.execute(
-                """
-                INSERT INTO amenitytag (amenityid, tagid)
-                VALUES (%s, %s)
-                ON CONFLICT (amenityid, tagid) DO NOTHING
-                RETURNING tagid
-                """,
-                (amenity_id, tag_id),
-            )
-            tag_result = cur.fetchone()
-            if tag_result:
-                inserted_tags.append(tag_result["tagid"])
-        
+
+        # Report attached tags in request order, each once
+        attached = set(amenity_result["attached_tags"])
+        inserted_tags = [t for t in dict.fromkeys(payload.tag_ids) if t in attached]
+
         # Commit transaction
         conn.commit()
-        
+
         return {
             "amenity_id": amenity_id,
             "attached_tags": inserted_tags,
@@ -1235,8 +1779,6 @@ def create_amenity_with_tags(payload: AmenityWithTagsCreate):
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
 
 
 
@@ -1245,48 +1787,24 @@ def create_amenity_with_tags(payload: AmenityWithTagsCreate):
 # ----------------------------------------------------------------
 
 @app.post("/buildings/with-address")
-def create_building_with_address(payload: BuildingWithAddressCreate):
-    
-    conn = get_conn()
-    cur = conn.cursor()
-    
+def create_building_with_address(payload: BuildingWithAddressCreate, conn: DbConn):
+    cur = conn.shared_cursor()
+
     try:
-        # Set autocommit to False FIRST, before any SQL statements
-        conn.set_session(autocommit=False)
-        
-        # Now we can set transaction isolation level (optional, defaults are usually fine)
-        cur.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
-        
-        # Advanced Query 1: Insert the address, get back the new AddressId
-        cur.execute(
-            """
-            INSERT INTO address (address, lat, lon)
-            VALUES (%s, %s, %s)
-            RETURNING addressid
-            """,
-            (payload.address, payload.lat, payload.lon),
-        )
-        address_result = cur.fetchone()
-        if not address_result:
-            raise Exception("Failed to create address")
-        address_id = address_result["addressid"]
-        
-        # Advanced Query 2: Insert the building using the AddressId from step 1
-        cur.execute(
-            """
-            INSERT INTO building (name, addressid)
-            VALUES (%s, %s)
-            RETURNING buildingid, name, addressid
-            """,
-            (payload.name, address_id),
+        # Advanced Query 1 + 2: insert the address and the building that
+        # references it in one round trip, as a prepared statement
+        execute_prepared(
+            cur,
+            "create_building_with_address",
+            (payload.address, payload.lat, payload.lon, payload.name),
         )
         building_result = cur.fetchone()
         if not building_result:
             raise Exception("Failed to create building")
-        
+
         # Commit transaction
         conn.commit()
-        
+
         return {
             "building_id": building_result["buildingid"],
             "name": building_result["name"],
@@ -1302,8 +1820,6 @@ def create_building_with_address(payload: BuildingWithAddressCreate):
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
 
 
 # ----------------------------------------------------------------
@@ -1311,31 +1827,22 @@ def create_building_with_address(payload: BuildingWithAddressCreate):
 # ----------------------------------------------------------------
 
 @app.get("/amenities/{amenity_id}/stats")
-def get_amenity_statistics(amenity_id: int):
+def get_amenity_statistics(amenity_id: int, conn: DbConn):
     """
     Call stored function fn_get_amenity_stats to get comprehensive statistics.
     Uses the function version which returns a table for easier consumption.
     """
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        # Call the function that returns a table
-        cur.execute(
-            "SELECT * FROM fn_get_amenity_stats(%s)",
-            (amenity_id,)
-        )
-        result = cur.fetchone()
-        if result:
-            return {
-                "amenity_id": amenity_id,
-                "avg_rating": float(result["avg_rating"]) if result["avg_rating"] is not None else 0,
-                "review_count": result["review_count"] if result["review_count"] is not None else 0,
-                "latest_review_date": result["latest_review_date"].isoformat() if result["latest_review_date"] is not None else None,
-                "building_name": result["building_name"] if result["building_name"] is not None else None
-            }
-        else:
-            raise HTTPException(status_code=404, detail="Amenity not found")
-    except psycopg2.Error as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    cur = conn.shared_cursor()
+    # Call the function that returns a table
+    execute_prepared(cur, "get_amenity_stats", (amenity_id,))
+    result = cur.fetchone()
+    if result:
+        return {
+            "amenity_id": amenity_id,
+            "avg_rating": float(result["avg_rating"]) if result["avg_rating"] is not None else 0,
+            "review_count": result["review_count"] if result["review_count"] is not None else 0,
+            "latest_review_date": result["latest_review_date"].isoformat() if result["latest_review_date"] is not None else None,
+            "building_name": result["building_name"] if result["building_name"] is not None else None
+        }
+    else:
+        raise HTTPException(status_code=404, detail="Amenity not found")
@@ -0,0 +1,64 @@
+"""
+Fail if a route handler is declared `async def` without awaiting anything.
+
+The API talks to Postgres through psycopg2, which blocks. FastAPI runs plain
+`def` handlers in its threadpool, but an `async def` handler runs on the event
+loop itself, so a blocking query there stalls every other request.
+
+Usage:
+    python scripts/check_sync_routes.py [main.py ...]
+"""
+
+import ast
+import sys
+from pathlib import Path
+
+ROUTE_METHODS = {"get", "post", "put", "patch", "delete", "options", "head", "api_route"}
+DEFAULT_FILES = [Path(__file__).resolve().parent.parent / "main.py"]
+
+
+def is_route_decorator(node: ast.expr) -> bool:
+    # Matches @app.get(...), @router.post(...), etc.
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr in ROUTE_METHODS
+    )
+
+
+def awaits_something(func: ast.AsyncFunctionDef) -> bool:
+    return any(
+        isinstance(node, (ast.Await, ast.AsyncFor, ast.AsyncWith))
+        for node in ast.walk(func)
+    )
+
+
+def check_file(path: Path):
+    tree = ast.parse(path.read_text(), filename=str(path))
+    problems = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.AsyncFunctionDef):
+            continue
+        if not any(is_route_decorator(d) for d in node.decorator_list):
+            continue
+        if not awaits_something(node):
+            problems.append(
+                f"{path}:{node.lineno}: route '{node.name}' is async def but never awaits; "
+                "declare it with plain def so it runs in the threadpool"
+            )
+    return problems
+
+
+def main(argv):
+    files = [Path(arg) for arg in argv] or DEFAULT_FILES
+    problems = []
+    for path in files:
+        problems.extend(check_file(path))
+
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,10 +1,15 @@
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
 import os
 import random
 import json
-from datetime import datetime, timedelta
+import sqlite3
+import uuid
+from datetime import date, datetime, timedelta
 
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
 import requests
 from bs4 import BeautifulSoup
 from faker import Faker
@@ -17,9 +22,21 @@ import googlemaps
 DB_URL = os.environ.get("DATABASE_URL", "postgres://amen:amenities@db:5432/amenities")
 BUILDING_LIST_URL = "https://fs.illinois.edu/building-list-by-building-number/"
 
+# Geocoding is network-bound, so addresses are looked up concurrently
+GEOCODE_WORKERS = 16
+
+# Successful geocodes are kept on disk so reruns only look up new addresses
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "geocode_cache.sqlite3")
+
+# One keep-alive session for the page fetch and every geocode call. requests
+# keeps 10 connections per host by default; size the pool to the workers so
+# none of them pays a fresh TLS handshake per lookup
+http = requests.Session()
+http.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=GEOCODE_WORKERS))
+
 #move this to an env var later
 GMAPS_API_KEY = os.getenv("GMAPS_API_KEY")
-gmaps = googlemaps.Client(key=GMAPS_API_KEY)
+gmaps = googlemaps.Client(key=GMAPS_API_KEY, requests_session=http)
 
 
 # -------------------------------------------------------------------
@@ -84,6 +101,47 @@ def geocode_address(address: str):
 
 
 
+def open_geocode_cache():
+    cache = sqlite3.connect(GEOCODE_CACHE_PATH)
+    cache.execute(
+        "CREATE TABLE IF NOT EXISTS geocode (address TEXT PRIMARY KEY, lat REAL, lon REAL)"
+    )
+    return cache
+
+
+def cached_geocodes(cache, addresses):
+    """
+    Return {address: (lat, lon)} for the addresses already in the cache.
+    """
+    found = {}
+    addresses = list(addresses)
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(addresses), 500):
+        chunk = addresses[start:start + 500]
+        placeholders = ", ".join("?" * len(chunk))
+        for address, lat, lon in cache.execute(
+            f"SELECT address, lat, lon FROM geocode WHERE address IN ({placeholders})",
+            chunk,
+        ):
+            found[address] = (lat, lon)
+    return found
+
+
+def store_geocodes(cache, coords):
+    """
+    Save successful lookups ({address: (lat, lon)}); failures are retried next run.
+    """
+    cache.executemany(
+        "INSERT OR REPLACE INTO geocode (address, lat, lon) VALUES (?, ?, ?)",
+        [
+            (address, lat, lon)
+            for address, (lat, lon) in coords.items()
+            if lat is not None and lon is not None
+        ],
+    )
+    cache.commit()
+
+
 def fallback_random_coords():
     """
     Fallback: generate pseudo-random coordinates around UIUC campus.
@@ -93,15 +151,52 @@ def fallback_random_coords():
     return lat, lon
 
 
+# str.translate table deleting NUL and the other control characters below
+# space, except newline, carriage return and tab
+CONTROL_CHAR_TABLE = dict.fromkeys(
+    (i for i in range(32) if chr(i) not in "\n\r\t"), None
+)
+
+
 def clean_text(s: str) -> str:
     """
     Remove NULs and other problematic control characters from scraped strings.
     """
     if s is None:
         return ""
-    s = s.replace("\x00", "")
-    s = "".join(ch for ch in s if ord(ch) >= 32 or ch in "\n\r\t")
-    return s.strip()
+    return s.translate(CONTROL_CHAR_TABLE).strip()
+
+
+def copy_rows(cur, table: str, columns, rows, on_conflict: str = None):
+    """
+    Bulk-load rows with COPY ... FROM STDIN (CSV; None becomes NULL).
+    COPY has no ON CONFLICT, so when on_conflict is given (e.g.
+    "(userid, amenityid) DO NOTHING") the rows land in a temp table first and
+    move over with one INSERT ... SELECT.
+    """
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+
+    column_list = ", ".join(columns)
+    target = table
+    if on_conflict:
+        target = f"tmp_{table}"
+        cur.execute(
+            f"CREATE TEMP TABLE {target} AS SELECT {column_list} FROM {table} WITH NO DATA"
+        )
+
+    cur.copy_expert(f"COPY {target} ({column_list}) FROM STDIN WITH (FORMAT CSV)", buf)
+
+    if on_conflict:
+        cur.execute(
+            f"""
+            INSERT INTO {table} ({column_list})
+            SELECT {column_list} FROM {target}
+            ON CONFLICT {on_conflict}
+            """
+        )
+        cur.execute(f"DROP TABLE {target}")
 
 
 def get_db_connection():
@@ -131,58 +226,78 @@ def scrape_buildings(url: str):
     print(f"[SCRAPE] Fetching buildings from: {url}")
 
     try:
-        response = requests.get(url, timeout=15)
+        response = http.get(url, timeout=15)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
+        soup = BeautifulSoup(response.content, "lxml")
 
-        all_tables = soup.find_all("table")
-        if not all_tables:
-            print("[SCRAPE] WARNING: Found no tables on the page.")
+        rows = soup.select("table tr")
+        if not rows:
+            print("[SCRAPE] WARNING: Found no table rows on the page.")
             return []
 
-        print(f"[SCRAPE] Found {len(all_tables)} table(s). Processing rows...")
-
-        for table in all_tables:
-            rows = table.find_all("tr")
-            for row in rows:
-                cols = row.find_all("td")
+        print(f"[SCRAPE] Found {len(rows)} table row(s). Processing...")
 
-                # Expecting something like:
-                # 0: code, 1: name, 2: street, 3: city/state/ZIP, 4: maybe ZIP or extra
-                if len(cols) >= 3:
-                    raw_name = cols[1].get_text(strip=True)
+        for row in rows:
+            # Only the row's own cells, and no further than the city column.
+            cols = row.find_all("td", recursive=False, limit=4)
 
-                    # Street is usually in column index 2
-                    street_part = cols[2].get_text(strip=True)
+            # Expecting something like:
+            # 0: code, 1: name, 2: street, 3: city/state/ZIP, 4: maybe ZIP or extra
+            if len(cols) < 3:
+                continue
 
-                    # If there is a fourth column, assume it holds city/state/ZIP.
-                    if len(cols) >= 4:
-                        city_part = cols[3].get_text(strip=True)
-                        raw_address = f"{street_part}, {city_part}"
-                    else:
-                        # Fallback: just use whatever is in column 2
-                        raw_address = street_part
+            raw_name = cols[1].get_text(strip=True)
 
-                    building_name = clean_text(raw_name)
-                    address = clean_text(raw_address)
+            # Street is usually in column index 2
+            street_part = cols[2].get_text(strip=True)
 
-                    if building_name and address and building_name not in buildings:
-                        print(f"[SCRAPE] Found building: '{building_name}' @ '{address}'")
+            # If there is a fourth column, assume it holds city/state/ZIP.
+            if len(cols) == 4:
+                city_part = cols[3].get_text(strip=True)
+                raw_address = f"{street_part}, {city_part}"
+            else:
+                # Fallback: just use whatever is in column 2
+                raw_address = street_part
 
-                        # Geocode this full address
-                        lat, lon = geocode_address(address)
-                        if lat is None or lon is None:
-                            print(f"[SCRAPE] WARN: No valid geocode for '{address}', using fallback coords.")
-                            lat, lon = fallback_random_coords()
+            building_name = clean_text(raw_name)
+            address = clean_text(raw_address)
 
-                        buildings[building_name] = {
-                            "name": building_name,
-                            "address": address,
-                            "lat": lat,
-                            "lon": lon,
-                        }
+            if building_name and address and building_name not in buildings:
+                print(f"[SCRAPE] Found building: '{building_name}' @ '{address}'")
+                buildings[building_name] = {
+                    "name": building_name,
+                    "address": address,
+                    "lat": None,
+                    "lon": None,
+                }
 
         print(f"[SCRAPE] Collected {len(buildings)} unique buildings.")
+
+        # Geocode each distinct address once, GEOCODE_WORKERS requests at a
+        # time, skipping any the on-disk cache already knows
+        addresses = list(dict.fromkeys(b["address"] for b in buildings.values()))
+        cache = open_geocode_cache()
+        try:
+            coords = cached_geocodes(cache, addresses)
+            pending = [address for address in addresses if address not in coords]
+            print(
+                f"[SCRAPE] Geocoding {len(pending)} of {len(addresses)} distinct addresses "
+                f"({len(coords)} cached)..."
+            )
+            with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as executor:
+                looked_up = dict(zip(pending, executor.map(geocode_address, pending)))
+            store_geocodes(cache, looked_up)
+            coords.update(looked_up)
+        finally:
+            cache.close()
+
+        for b in buildings.values():
+            lat, lon = coords[b["address"]]
+            if lat is None or lon is None:
+                print(f"[SCRAPE] WARN: No valid geocode for '{b['address']}', using fallback coords.")
+                lat, lon = fallback_random_coords()
+            b["lat"], b["lon"] = lat, lon
+
         return list(buildings.values())
 
     except requests.RequestException as e:
@@ -205,10 +320,14 @@ def insert_buildings_and_amenities(conn, buildings_data):
 
     amenity_types = ["Bathroom", "WaterFountain", "VendingMachine"]
     floors = ["B", "1", "2", "3", "4", "5"]
+    amenity_rows = []
 
+    # Keyed by address / building name; a repeated key keeps its last values,
+    # as it did when each row was upserted in turn (ON CONFLICT DO UPDATE can't
+    # touch the same row twice in one statement)
+    address_rows = {}
+    building_rows = {}
     for b in buildings_data:
-        name = b["name"]
-        address = b["address"]
         lat = b["lat"]
         lon = b["lon"]
 
@@ -216,56 +335,56 @@ def insert_buildings_and_amenities(conn, buildings_data):
         if lat is None or lon is None:
             lat, lon = fallback_random_coords()
 
-        # Upsert Address by address string
-        cur.execute("SELECT addressid FROM address WHERE address = %s", (address,))
-        address_result = cur.fetchone()
+        address_rows[b["address"]] = (b["address"], lat, lon)
+        building_rows[b["name"]] = b["address"]
 
-        if address_result:
-            address_id = address_result[0]
-            # Optionally update lat/lon if we want them fresh
-            cur.execute(
-                "UPDATE address SET lat = %s, lon = %s WHERE addressid = %s",
-                (lat, lon, address_id),
-            )
-        else:
-            cur.execute(
-                "INSERT INTO address (address, lat, lon) VALUES (%s, %s, %s) RETURNING addressid",
-                (address, lat, lon),
-            )
-            address_id = cur.fetchone()[0]
+    # Upsert every address in one statement per page; the conflict check runs
+    # server-side on the unique address column
+    address_ids = dict(
+        (address, address_id)
+        for address_id, address in execute_values(
+            cur,
+            """
+            INSERT INTO address (address, lat, lon) VALUES %s
+            ON CONFLICT (address) DO UPDATE SET lat = EXCLUDED.lat, lon = EXCLUDED.lon
+            RETURNING addressid, address
+            """,
+            list(address_rows.values()),
+            page_size=1000,
+            fetch=True,
+        )
+    )
 
-        # Upsert Building by name
-        cur.execute("SELECT buildingid FROM building WHERE name = %s", (name,))
-        building_result = cur.fetchone()
+    # Same for buildings, pointing each at its address
+    building_ids = dict(
+        (name, building_id)
+        for building_id, name in execute_values(
+            cur,
+            """
+            INSERT INTO building (name, addressid) VALUES %s
+            ON CONFLICT (name) DO UPDATE SET addressid = EXCLUDED.addressid
+            RETURNING buildingid, name
+            """,
+            [(name, address_ids[address]) for name, address in building_rows.items()],
+            page_size=1000,
+            fetch=True,
+        )
+    )
 
-        if building_result:
-            building_id = building_result[0]
-            cur.execute(
-                "UPDATE building SET addressid = %s WHERE buildingid = %s",
-                (address_id, building_id),
-            )
-        else:
-            cur.execute(
-                "INSERT INTO building (name, addressid) VALUES (%s, %s) RETURNING buildingid",
-                (name, address_id),
-            )
-            building_id = cur.fetchone()[0]
+    for b in buildings_data:
+        building_id = building_ids[b["name"]]
 
-        # Insert sample amenities for this building
+        # Sample amenities for this building, inserted after the loop
         for amenity_type in amenity_types:
             num_amenities = random.randint(1, 4)
             for i in range(num_amenities):
                 floor = random.choice(floors)
                 notes = f"Located on floor {floor}, near entrance/exit {i+1}."
-                cur.execute(
-                    """
-                    INSERT INTO amenity (buildingid, type, floor, notes)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (building_id, amenity_type, floor, notes),
-                )
-
-    conn.commit()
+                amenity_rows.append((building_id, amenity_type, floor, notes))
+
+    # Streamed in with COPY instead of a round trip per amenity
+    copy_rows(cur, "amenity", ("buildingid", "type", "floor", "notes"), amenity_rows)
+
     print("[SEED] Buildings, addresses, and amenities inserted.")
 
 
@@ -283,29 +402,35 @@ def generate_and_insert_random_data(conn, num_reviews=1000, num_users=100):
 
     print(f"[SEED] Inserting up to {num_users} users...")
 
-    user_ids = []
-    for _ in range(num_users):
-        try:
-            temp_cur.execute(
-                """
-                INSERT INTO "User" (UserName, Email, JoinDate)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (Email) DO NOTHING
-                RETURNING UserId
-                """,
-                (
-                    fake.user_name(),
-                    fake.unique.email(),
-                    fake.date_between(start_date="-2y", end_date="today"),
-                ),
-            )
-            result = temp_cur.fetchone()
-            if result:
-                user_ids.append(result[0])
-        except psycopg2.IntegrityError:
-            conn.rollback()
+    # uuid emails are unique without fake.unique's seen-set and retry loop;
+    # join dates fall within the last two years
+    today = date.today()
+    user_rows = [
+        (
+            fake.user_name(),
+            f"user_{uuid.uuid4().hex}@example.test",
+            today - timedelta(days=random.randrange(730)),
+        )
+        for _ in range(num_users)
+    ]
+    # One statement per page; emails that already exist are skipped by
+    # ON CONFLICT, and RETURNING hands back only the ids actually inserted
+    user_ids = [
+        row[0]
+        for row in execute_values(
+            temp_cur,
+            """
+            INSERT INTO "User" (UserName, Email, JoinDate)
+            VALUES %s
+            ON CONFLICT (Email) DO NOTHING
+            RETURNING UserId
+            """,
+            user_rows,
+            page_size=1000,
+            fetch=True,
+        )
+    ]
 
-    conn.commit()
     print(f"[SEED] Users inserted: {len(user_ids)}")
 
     # Tags
@@ -320,26 +445,21 @@ def generate_and_insert_random_data(conn, num_reviews=1000, num_users=100):
         "ColdWater",
         "WarmWater",
     ]
-    tag_ids = {}
     print(f"[SEED] Inserting tags: {len(tags_to_insert)}")
-    for label in tags_to_insert:
-        temp_cur.execute(
-            """
-            INSERT INTO tag (label)
-            VALUES (%s)
-            ON CONFLICT (label) DO NOTHING
-            RETURNING tagid
-            """,
-            (label,),
-        )
-        result = temp_cur.fetchone()
-        if result:
-            tag_ids[label] = result[0]
-        else:
-            temp_cur.execute("SELECT tagid FROM tag WHERE label = %s", (label,))
-            existing = temp_cur.fetchone()
-            if existing:
-                tag_ids[label] = existing[0]
+    # All labels go over as one array parameter; unnest() turns them into rows
+    temp_cur.execute(
+        """
+        INSERT INTO tag (label)
+        SELECT unnest(%s::text[])
+        ON CONFLICT (label) DO NOTHING
+        """,
+        (tags_to_insert,),
+    )
+    # Read ids back for new and pre-existing labels alike
+    temp_cur.execute(
+        "SELECT label, tagid FROM tag WHERE label = ANY(%s)", (tags_to_insert,)
+    )
+    tag_ids = dict(temp_cur.fetchall())
 
     # Map amenities
     temp_cur.execute("SELECT amenityid, type FROM amenity")
@@ -353,14 +473,28 @@ def generate_and_insert_random_data(conn, num_reviews=1000, num_users=100):
     print(f"[SEED] Inserting {num_reviews} reviews...")
 
     base_time = datetime.now() - timedelta(days=365)
+    span_seconds = int((datetime.now() - base_time).total_seconds())
     review_rows = []
-    amenity_tag_pairs = []
+    # A set, so repeated (amenity, tag) draws are dropped as they happen
+    amenity_tag_pairs = set()
+
+    # Draw each review's user, amenity, rating and timestamp in bulk up front;
+    # Faker's date_time_between and per-row random.choice calls dominated the loop
+    review_users = random.choices(user_ids, k=num_reviews)
+    review_amenities = random.choices(amenity_ids, k=num_reviews)
+    overall_ratings = [round(random.uniform(1.0, 5.0), 1) for _ in range(num_reviews)]
+    timestamps = [
+        base_time + timedelta(seconds=offset)
+        for offset in random.choices(range(span_seconds), k=num_reviews)
+    ]
+    # Built once rather than re-listing tag_ids.values() on every review
+    tag_id_values = tuple(tag_ids.values())
+    max_tags_per_review = min(3, len(tag_id_values))
 
-    for _ in range(num_reviews):
-        user_id = random.choice(user_ids)
-        amenity_id = random.choice(amenity_ids)
+    for user_id, amenity_id, overall_rating, timestamp in zip(
+        review_users, review_amenities, overall_ratings, timestamps
+    ):
         amenity_type = amenity_map[amenity_id]
-        overall_rating = round(random.uniform(1.0, 5.0), 1)
 
         # Rating details based on type
         if amenity_type == "Bathroom":
@@ -388,51 +522,54 @@ def generate_and_insert_random_data(conn, num_reviews=1000, num_users=100):
         else:
             rating_details = {}
 
-        timestamp = fake.date_time_between(
-            start_date=base_time, end_date="now", tzinfo=None
-        )
-
         review_rows.append(
             (user_id, amenity_id, overall_rating, json.dumps(rating_details), timestamp)
         )
 
         # Randomly assign tags to amenity
-        if random.random() < 0.6 and tag_ids:
+        if random.random() < 0.6 and tag_id_values:
             selected_tags = random.sample(
-                list(tag_ids.values()),
-                k=random.randint(1, min(3, len(tag_ids))),
+                tag_id_values, k=random.randint(1, max_tags_per_review)
             )
-            for tag_id in selected_tags:
-                amenity_tag_pairs.append((amenity_id, tag_id))
+            amenity_tag_pairs.update((amenity_id, tag_id) for tag_id in selected_tags)
 
-    # Insert reviews; ignore duplicate (userid, amenityid)
-    cur.executemany(
-        """
-        INSERT INTO review (userid, amenityid, overallrating, ratingdetails, timestamp)
-        VALUES (%s, %s, %s, %s, %s)
-        ON CONFLICT (userid, amenityid) DO NOTHING
-        """,
+    # COPY in the reviews; ignore duplicate (userid, amenityid)
+    copy_rows(
+        cur,
+        "review",
+        ("userid", "amenityid", "overallrating", "ratingdetails", "timestamp"),
         review_rows,
+        on_conflict="(userid, amenityid) DO NOTHING",
     )
 
-    # Deduplicate amenity-tag pairs
-    unique_amenity_tags = list(set(amenity_tag_pairs))
-    for amenity_id, tag_id in unique_amenity_tags:
-        cur.execute(
-            """
-            INSERT INTO amenitytag (amenityid, tagid)
-            VALUES (%s, %s)
-            ON CONFLICT (amenityid, tagid) DO NOTHING
-            """,
-            (amenity_id, tag_id),
-        )
+    copy_rows(
+        cur,
+        "amenitytag",
+        ("amenityid", "tagid"),
+        amenity_tag_pairs,
+        on_conflict="(amenityid, tagid) DO NOTHING",
+    )
 
-    conn.commit()
     print(
-        f"[SEED] Inserted {len(review_rows)} reviews and {len(unique_amenity_tags)} amenity-tag pairs."
+        f"[SEED] Inserted {len(review_rows)} reviews and {len(amenity_tag_pairs)} amenity-tag pairs."
     )
 
 
+# -------------------------------------------------------------------
+# Planner statistics
+# -------------------------------------------------------------------
+
+def analyze_tables(conn):
+    """
+    Refresh planner statistics after the bulk load so /amenities keyword
+    search is planned against the pg_trgm indexes instead of seq-scans.
+    """
+    cur = conn.cursor()
+    for table in ("address", "building", "amenity", "review", "tag", "amenitytag"):
+        cur.execute(f"ANALYZE {table}")
+    print("[SEED] Table statistics refreshed.")
+
+
 # -------------------------------------------------------------------
 # Main
 # -------------------------------------------------------------------
@@ -450,8 +587,15 @@ def main():
             conn.close()
             return
 
+        # The whole load is one transaction, committed once at the end without
+        # waiting for the WAL flush (a crash just means re-running the seeder)
+        cur = conn.cursor()
+        cur.execute("SET LOCAL synchronous_commit = off")
+
         insert_buildings_and_amenities(conn, buildings_data)
         generate_and_insert_random_data(conn, num_reviews=1000, num_users=100)
+        analyze_tables(conn)
+        conn.commit()
 
         print("[MAIN] Data population complete 🎉")
     except Exception as e:
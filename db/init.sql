@@ -25,7 +25,7 @@ CREATE TABLE "User" (
 ------------------------------------------------------------
 CREATE TABLE Address (
     AddressId SERIAL PRIMARY KEY,
-    Address   VARCHAR(255) NOT NULL,
+    Address   VARCHAR(255) NOT NULL UNIQUE,
     Lat       DECIMAL(9,6) NOT NULL,
     Lon       DECIMAL(9,6) NOT NULL,
     -- Attribute-level constraint: UIUC campus bounds (approximately)
@@ -38,7 +38,7 @@ CREATE TABLE Address (
 ------------------------------------------------------------
 CREATE TABLE Building (
     BuildingId SERIAL PRIMARY KEY,
-    Name       VARCHAR(255) NOT NULL,
+    Name       VARCHAR(255) NOT NULL UNIQUE,
     AddressId  INT NOT NULL REFERENCES Address(AddressId)
 );
 
@@ -51,7 +51,9 @@ CREATE TABLE Amenity (
     Type       VARCHAR(40) NOT NULL CHECK (Type IN ('Bathroom','WaterFountain','VendingMachine')),
     Floor      VARCHAR(20) NOT NULL,
     Notes      TEXT,
-    ReviewCount INT NOT NULL DEFAULT 0
+    ReviewCount INT NOT NULL DEFAULT 0,
+    -- Keyword search document: building name + address + notes (kept by triggers)
+    SearchTsv  TSVECTOR
 );
 
 ------------------------------------------------------------
@@ -93,7 +95,7 @@ CREATE TABLE AmenityTag (
 );
 
 ------------------------------------------------------------
--- Helpful indexes for keyword search (for later use)
+-- Trigram indexes backing the ILIKE '%keyword%' search in GET /amenities
 ------------------------------------------------------------
 
 -- Building name & address fuzzy search
@@ -110,6 +112,161 @@ CREATE INDEX IF NOT EXISTS idx_amenity_notes_trgm
 ON Amenity
 USING gin (Notes gin_trgm_ops);
 
+-- Full-text keyword search used by GET /amenities
+CREATE INDEX IF NOT EXISTS idx_amenity_search_tsv
+ON Amenity
+USING gin (SearchTsv);
+
+------------------------------------------------------------
+-- Review lookups by amenity
+------------------------------------------------------------
+
+-- Serves GET /amenities/{id}/reviews (filter + ORDER BY TimeStamp DESC)
+-- and, via its leading column, every join/aggregate on Review.AmenityId.
+-- OverallRating is carried along so per-amenity rating aggregates can be
+-- answered from the index alone
+CREATE INDEX IF NOT EXISTS idx_review_amenity_ts
+ON Review (AmenityId, TimeStamp DESC) INCLUDE (OverallRating);
+
+------------------------------------------------------------
+-- Foreign-key and filter indexes
+------------------------------------------------------------
+
+-- GET /amenities?amenity_type=... and the per-type leaderboards
+CREATE INDEX IF NOT EXISTS idx_amenity_type
+ON Amenity (Type);
+
+-- Amenity -> Building joins and DELETE /buildings/{id}
+CREATE INDEX IF NOT EXISTS idx_amenity_building
+ON Amenity (BuildingId);
+
+-- Building -> Address joins
+CREATE INDEX IF NOT EXISTS idx_building_address
+ON Building (AddressId);
+
+-- Tag -> AmenityTag lookups (the primary key only leads with AmenityId)
+CREATE INDEX IF NOT EXISTS idx_amenitytag_tag
+ON AmenityTag (TagId, AmenityId);
+
+------------------------------------------------------------
+-- Precomputed per-amenity rating aggregates
+------------------------------------------------------------
+
+-- Joined by GET /amenities instead of aggregating Review on every request.
+-- The API refreshes it shortly after review writes (and periodically).
+CREATE MATERIALIZED VIEW amenity_rating_mv AS
+SELECT
+    AmenityId,
+    AVG(OverallRating) AS avg_rating,
+    COUNT(ReviewId)    AS review_count
+FROM Review
+GROUP BY AmenityId;
+
+-- Unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX idx_amenity_rating_mv_amenity
+ON amenity_rating_mv (AmenityId);
+
+------------------------------------------------------------
+-- Precomputed leaderboards
+------------------------------------------------------------
+
+-- Top 15 of each leaderboard, read by the /leaderboard endpoints and refreshed
+-- alongside amenity_rating_mv. Reviews are first collapsed to one row per
+-- amenity; averages are rebuilt as SUM(Rating_Sum) / SUM(Review_Count) so they
+-- stay review-weighted. Rank is the unique key CONCURRENTLY needs.
+
+-- Query 1: Top 15 Buildings for Clean Bathrooms AND a Vending Machine
+-- (EXISTS is a semi-join, so a building's vending machines don't multiply rows)
+CREATE MATERIALIZED VIEW mv_leaderboard_bathrooms_vending AS
+SELECT
+    ROW_NUMBER() OVER (ORDER BY ROUND(CAST(SUM(R.Rating_Sum) / SUM(R.Review_Count) AS NUMERIC), 2) DESC) AS rank,
+    B.Name AS building_name,
+    A.Type AS amenity_type,
+    ROUND(CAST(SUM(R.Rating_Sum) / SUM(R.Review_Count) AS NUMERIC), 2)::float8 AS avg_bathroom_rating,
+    A_D.Address AS address
+FROM Building B
+JOIN Amenity A ON B.BuildingId = A.BuildingId
+JOIN (
+    SELECT AmenityId, SUM(OverallRating) AS Rating_Sum, COUNT(*) AS Review_Count
+    FROM Review
+    GROUP BY AmenityId
+) AS R ON A.AmenityId = R.AmenityId
+JOIN Address A_D ON B.AddressId = A_D.AddressId
+WHERE A.Type = 'Bathroom'
+  AND EXISTS (
+      SELECT 1
+      FROM Amenity A2
+      WHERE A2.BuildingId = B.BuildingId AND A2.Type = 'VendingMachine'
+  )
+GROUP BY B.Name, A.Type, A_D.Address
+ORDER BY rank
+LIMIT 15;
+
+CREATE UNIQUE INDEX idx_mv_leaderboard_bathrooms_vending_rank
+ON mv_leaderboard_bathrooms_vending (rank);
+
+-- Query 2: Coldest Water Fountain Ranking - Top 15 Fountains
+-- (ColdWater tags are counted per fountain before grouping, so fountains that
+-- share a building, floor and notes do not add up each other's tags)
+CREATE MATERIALIZED VIEW mv_leaderboard_coldest_fountains AS
+SELECT
+    ROW_NUMBER() OVER (
+        ORDER BY CT.Cold_Tag_Count DESC,
+                 ROUND(CAST(SUM(R.Rating_Sum) / SUM(R.Review_Count) AS NUMERIC), 2) DESC
+    ) AS rank,
+    B.Name AS building_name,
+    A.Floor AS floor,
+    A.Notes AS notes,
+    ROUND(CAST(SUM(R.Rating_Sum) / SUM(R.Review_Count) AS NUMERIC), 2)::float8 AS avg_rating,
+    CT.Cold_Tag_Count AS cold_tag_count
+FROM Building B
+JOIN Amenity A ON B.BuildingId = A.BuildingId
+JOIN (
+    SELECT AmenityId, SUM(OverallRating) AS Rating_Sum, COUNT(*) AS Review_Count
+    FROM Review
+    GROUP BY AmenityId
+) AS R ON A.AmenityId = R.AmenityId
+JOIN (
+    SELECT AT.AmenityId, COUNT(*) AS Cold_Tag_Count
+    FROM AmenityTag AT
+    JOIN Tag T ON AT.TagId = T.TagId
+    WHERE T.Label = 'ColdWater'
+    GROUP BY AT.AmenityId
+) AS CT ON A.AmenityId = CT.AmenityId
+WHERE A.Type = 'WaterFountain'
+GROUP BY B.Name, A.Floor, A.Notes, CT.Cold_Tag_Count
+ORDER BY rank
+LIMIT 15;
+
+CREATE UNIQUE INDEX idx_mv_leaderboard_coldest_fountains_rank
+ON mv_leaderboard_coldest_fountains (rank);
+
+-- Query 4: Overall Amenity Ranking by Rating (Top 15)
+CREATE MATERIALIZED VIEW mv_leaderboard_overall AS
+SELECT
+    ROW_NUMBER() OVER (
+        ORDER BY ROUND(CAST(SUM(R.Rating_Sum) / SUM(R.Review_Count) AS NUMERIC), 2) DESC,
+                 SUM(R.Review_Count) DESC
+    ) AS rank,
+    B.Name AS building_name,
+    A.Type AS type,
+    A.Floor AS floor,
+    ROUND(CAST(SUM(R.Rating_Sum) / SUM(R.Review_Count) AS NUMERIC), 2)::float8 AS avg_rating,
+    SUM(R.Review_Count)::bigint AS review_count
+FROM Building B
+JOIN Amenity A ON B.BuildingId = A.BuildingId
+JOIN (
+    SELECT AmenityId, SUM(OverallRating) AS Rating_Sum, COUNT(*) AS Review_Count
+    FROM Review
+    GROUP BY AmenityId
+) AS R ON A.AmenityId = R.AmenityId
+GROUP BY B.Name, A.Type, A.Floor
+ORDER BY rank
+LIMIT 15;
+
+CREATE UNIQUE INDEX idx_mv_leaderboard_overall_rank
+ON mv_leaderboard_overall (rank);
+
 ----------------------------------------------------------
 
 ------------------------------------------------------------
@@ -154,16 +311,24 @@ AS $$
 BEGIN
     -- Advanced Query 1: Aggregate statistics with JOIN
     RETURN QUERY
+    -- The aggregate runs in a LATERAL subquery over this amenity's reviews only,
+    -- so the outer query needs no GROUP BY
     SELECT 
-        COALESCE(AVG(R.OverallRating), 0)::NUMERIC,
-        COUNT(R.ReviewId),
-        MAX(R.TimeStamp),
+        COALESCE(R.avg_rating, 0)::NUMERIC,
+        R.review_count,
+        R.latest_review_date,
         B.Name
     FROM Amenity A
     JOIN Building B ON A.BuildingId = B.BuildingId
-    LEFT JOIN Review R ON A.AmenityId = R.AmenityId
-    WHERE A.AmenityId = p_amenity_id
-    GROUP BY A.AmenityId, B.Name;
+    CROSS JOIN LATERAL (
+        SELECT
+            AVG(OverallRating) AS avg_rating,
+            COUNT(*)           AS review_count,
+            MAX(TimeStamp)     AS latest_review_date
+        FROM Review
+        WHERE AmenityId = A.AmenityId
+    ) R
+    WHERE A.AmenityId = p_amenity_id;
     
     -- Control Structure: IF statement for validation (handled by COALESCE above)
 END;
@@ -238,4 +403,122 @@ $$;
 CREATE TRIGGER trg_update_review_count
 AFTER INSERT OR UPDATE OR DELETE ON Review
 FOR EACH ROW
-EXECUTE FUNCTION fn_update_review_count();
\ No newline at end of file
+EXECUTE FUNCTION fn_update_review_count();
+
+-- Trigger 3: Keep Amenity.SearchTsv in sync with its building name, address, and notes
+CREATE OR REPLACE FUNCTION fn_amenity_search_tsv(p_building_id INT, p_notes TEXT)
+RETURNS TSVECTOR
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT to_tsvector(
+        'simple',
+        COALESCE(B.Name, '') || ' ' || COALESCE(AD.Address, '') || ' ' || COALESCE(p_notes, '')
+    )
+    FROM Building B
+    JOIN Address AD ON B.AddressId = AD.AddressId
+    WHERE B.BuildingId = p_building_id;
+$$;
+
+CREATE OR REPLACE FUNCTION fn_set_amenity_search_tsv()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Event: BEFORE INSERT, or UPDATE of BuildingId/Notes, on Amenity
+    NEW.SearchTsv := fn_amenity_search_tsv(NEW.BuildingId, NEW.Notes);
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_set_amenity_search_tsv
+BEFORE INSERT OR UPDATE OF BuildingId, Notes ON Amenity
+FOR EACH ROW
+EXECUTE FUNCTION fn_set_amenity_search_tsv();
+
+CREATE OR REPLACE FUNCTION fn_refresh_building_search_tsv()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Event: AFTER UPDATE of Name/AddressId on Building
+    -- Action: Rebuild the search document of every amenity in the building
+    UPDATE Amenity
+    SET SearchTsv = fn_amenity_search_tsv(BuildingId, Notes)
+    WHERE BuildingId = NEW.BuildingId;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_refresh_building_search_tsv
+AFTER UPDATE OF Name, AddressId ON Building
+FOR EACH ROW
+EXECUTE FUNCTION fn_refresh_building_search_tsv();
+
+CREATE OR REPLACE FUNCTION fn_refresh_address_search_tsv()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Event: AFTER UPDATE of Address on Address
+    -- Action: Rebuild the search document of every amenity at that address
+    UPDATE Amenity A
+    SET SearchTsv = fn_amenity_search_tsv(A.BuildingId, A.Notes)
+    FROM Building B
+    WHERE B.AddressId = NEW.AddressId
+      AND A.BuildingId = B.BuildingId;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_refresh_address_search_tsv
+AFTER UPDATE OF Address ON Address
+FOR EACH ROW
+EXECUTE FUNCTION fn_refresh_address_search_tsv();
+
+------------------------------------------------------------
+-- Change notifications for the precomputed views
+------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION fn_notify_ratings_changed()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Event: AFTER INSERT/UPDATE/DELETE on a table the rating views read
+    -- Action: NOTIFY ratings_changed; the API LISTENs and refreshes the views.
+    --         Delivered on commit, and repeats within a transaction fold into one
+    PERFORM pg_notify('ratings_changed', '');
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_notify_ratings_changed_review
+AFTER INSERT OR UPDATE OR DELETE ON Review
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_notify_ratings_changed();
+
+CREATE TRIGGER trg_notify_ratings_changed_amenitytag
+AFTER INSERT OR UPDATE OR DELETE ON AmenityTag
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_notify_ratings_changed();
+
+CREATE TRIGGER trg_notify_ratings_changed_tag
+AFTER INSERT OR UPDATE OR DELETE ON Tag
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_notify_ratings_changed();
+
+CREATE TRIGGER trg_notify_ratings_changed_amenity
+AFTER INSERT OR UPDATE OR DELETE ON Amenity
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_notify_ratings_changed();
+
+CREATE TRIGGER trg_notify_ratings_changed_building
+AFTER INSERT OR UPDATE OR DELETE ON Building
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_notify_ratings_changed();
+
+CREATE TRIGGER trg_notify_ratings_changed_address
+AFTER INSERT OR UPDATE OR DELETE ON Address
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_notify_ratings_changed();
@@ -567,9 +567,16 @@ export default function App() {
         throw new Error(detail || 'Request failed')
       }
 
+      const saved = await response.json()
       setSubmitMessage({ type: 'success', text: 'Thanks for sharing your rating!' })
-      // Refresh data to show new average (await so the useEffect can sync selectedAmenity)
-      await fetchAmenities(searchTerm)
+      // Show the new average from the response; /amenities reads ratings from a
+      // view that is refreshed a few seconds later, so a refetch would be stale
+      // (the useEffect syncs selectedAmenity from this update)
+      setAmenities(prev => prev.map(a => (
+        a.amenityId === saved.amenity_id
+          ? { ...a, review: { avgRating: saved.avg_rating, reviewCount: saved.review_count } }
+          : a
+      )))
     } catch (error) {
       setSubmitMessage({
         type: 'error',